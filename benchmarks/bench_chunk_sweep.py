@@ -0,0 +1,140 @@
+"""Retrieval quality against cost for a sweep of chunk size, overlap and k.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_chunk_sweep data \\
+        --questions benchmarks/grammar_questions.jsonl \\
+        --chunk-sizes 64 128 256 512 --overlaps 0 16 64 --k 1 3 5
+
+``--questions`` is a JSON-lines file of ``{"question": ..., "passage": ...}``
+pairs, where the passage is a verbatim span of the corpus. A query counts as a
+hit when one of its top k chunks contains the whole passage (whitespace and
+case are ignored). Chunks are embedded with the deterministic
+HashingEmbeddings, so runs are repeatable offline and the numbers compare the
+chunking, not the embedding model.
+"""
+
+import argparse
+import glob
+import json
+import os
+import re
+import statistics
+import tempfile
+import time
+
+import lancedb
+from prettytable import PrettyTable
+
+from chunking import TiktokenTextSplitter, count_tokens
+from embeddings import HashingEmbeddings
+from loaders import get_loader, supported_patterns
+
+
+def load_corpus(directory):
+    docs = []
+    for pattern in supported_patterns():
+        for path in sorted(glob.glob(os.path.join(directory, pattern))):
+            docs.extend(get_loader(path)(path))
+    return docs
+
+
+def load_questions(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def normalize(text):
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+def directory_size(path):
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(path)
+        for name in names
+    )
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("corpus", nargs="?", default="data")
+    parser.add_argument("--questions", default="benchmarks/grammar_questions.jsonl")
+    parser.add_argument("--chunk-sizes", type=int, nargs="+", default=[128, 256, 512])
+    parser.add_argument("--overlaps", type=int, nargs="+", default=[0, 32, 64])
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 3, 5])
+    args = parser.parse_args()
+
+    docs = load_corpus(args.corpus)
+    questions = load_questions(args.questions)
+    passages = [normalize(question["passage"]) for question in questions]
+    print(f"{args.corpus}: {len(docs)} pages, {len(questions)} questions")
+
+    embeddings = HashingEmbeddings()
+    query_vectors = embeddings.embed_documents([q["question"] for q in questions])
+    table = PrettyTable(
+        [
+            "chunk_size",
+            "overlap",
+            "k",
+            "chunks",
+            "build s",
+            "index MiB",
+            "recall@k",
+            "prompt tokens",
+            "p50 ms",
+            "p95 ms",
+        ]
+    )
+    with tempfile.TemporaryDirectory() as directory:
+        db = lancedb.connect(directory)
+        for chunk_size in args.chunk_sizes:
+            for overlap in args.overlaps:
+                if overlap >= chunk_size:
+                    continue
+                start = time.perf_counter()
+                splitter = TiktokenTextSplitter(chunk_size, overlap)
+                texts = [chunk.page_content for chunk in splitter.split_documents(docs)]
+                rows = [
+                    {"vector": vector, "text": text}
+                    for vector, text in zip(embeddings.embed_documents(texts), texts)
+                ]
+                name = f"sweep_{chunk_size}_{overlap}"
+                index = db.create_table(name, data=rows)
+                build = time.perf_counter() - start
+                size = directory_size(os.path.join(directory, f"{name}.lance"))
+
+                for k in args.k:
+                    hits, prompt_tokens, latencies = 0, [], []
+                    for vector, passage in zip(query_vectors, passages):
+                        start = time.perf_counter()
+                        results = index.search(vector).limit(k).to_list()
+                        latencies.append(time.perf_counter() - start)
+                        retrieved = [result["text"] for result in results]
+                        hits += any(passage in normalize(text) for text in retrieved)
+                        prompt_tokens.append(sum(count_tokens(retrieved)))
+                    table.add_row(
+                        [
+                            chunk_size,
+                            overlap,
+                            k,
+                            len(texts),
+                            f"{build:.2f}",
+                            f"{size / 1024**2:.2f}",
+                            f"{hits / len(questions):.2f}",
+                            f"{statistics.mean(prompt_tokens):.0f}",
+                            f"{percentile(latencies, 0.5) * 1000:.2f}",
+                            f"{percentile(latencies, 0.95) * 1000:.2f}",
+                        ]
+                    )
+
+    print(table)
+
+
+if __name__ == "__main__":
+    main()
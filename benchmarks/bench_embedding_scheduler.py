@@ -0,0 +1,72 @@
+"""Embedding throughput against requests in flight, on a simulated provider.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_embedding_scheduler --texts 2000 --latency 0.2 \\
+        --requests-per-second 20 --in-flight 1 2 4 8
+
+The provider is FakeEmbeddingProvider: every request sleeps ``--latency``
+seconds and answers 429 above ``--requests-per-second`` (and at random with
+``--rate-limit-rate``), so no network or API key is needed.
+"""
+
+import argparse
+import time
+
+from prettytable import PrettyTable
+
+from embedding_scheduler import ScheduledEmbeddings
+from embeddings import FakeEmbeddingProvider, HashingEmbeddings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--texts", type=int, default=2000)
+    parser.add_argument("--request-size", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--requests-per-second", type=float, default=20)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--in-flight", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    texts = [f"chunk {i} of the benchmark corpus" for i in range(args.texts)]
+    expected = HashingEmbeddings().embed_documents(texts)
+
+    table = PrettyTable(
+        ["in flight", "seconds", "texts/s", "requests", "429s", "max concurrent"]
+    )
+    for in_flight in args.in_flight:
+        provider = FakeEmbeddingProvider(
+            latency=args.latency,
+            requests_per_second=args.requests_per_second,
+            rate_limit_rate=args.rate_limit_rate,
+        )
+        scheduler = ScheduledEmbeddings(
+            provider,
+            request_size=args.request_size,
+            max_in_flight=in_flight,
+            # Pace just under the simulated quota, as with the real one
+            requests_per_minute=args.requests_per_second * 60 * 0.9,
+            backoff_base=0.1,
+        )
+        start = time.perf_counter()
+        vectors = scheduler.embed_documents(texts)
+        seconds = time.perf_counter() - start
+        scheduler.close()
+        assert vectors == expected, "scheduled embedding changed the vectors"
+        table.add_row(
+            [
+                in_flight,
+                f"{seconds:.2f}",
+                f"{len(texts) / seconds:.0f}",
+                provider.requests,
+                scheduler.rate_limited,
+                provider.max_in_flight,
+            ]
+        )
+
+    print(table)
+
+
+if __name__ == "__main__":
+    main()
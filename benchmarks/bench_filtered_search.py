@@ -0,0 +1,159 @@
+"""Latency of document- and page-scoped searches with and without pushdown.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_filtered_search --rows 200000 --documents 1000 \\
+        --dimensions 768 --queries 200 --k 3
+
+The table holds ``--rows`` random vectors (see bench_vector_index) spread over
+``--documents`` documents of consecutive pages, with an IVF_PQ index once it
+reaches VECTOR_INDEX_MIN_ROWS. Each query is scoped to one document, then to
+a page range of it, and runs as a post-filter (search, then filter), as a
+prefilter scanning the filter columns, as a prefilter served by the BTREE
+index VectorIndexManager creates, and through LanceDBStore.search, which
+searches small scopes exactly. "full" is the share of queries that got all
+k rows.
+"""
+
+import argparse
+import tempfile
+import time
+
+import numpy as np
+import pyarrow as pa
+from prettytable import PrettyTable
+
+from benchmarks.bench_chunk_sweep import percentile
+from benchmarks.bench_vector_index import random_vectors
+from filters import RowFilter
+from vector_index import (
+    SCALAR_INDEX_COLUMNS,
+    VECTOR_INDEX_MIN_ROWS,
+    VECTOR_NPROBES,
+    VECTOR_REFINE_FACTOR,
+    index_partitions,
+    index_sub_vectors,
+)
+from vector_store import LanceDBStore, documents_schema
+
+
+def time_filtered(table, queries, filters, k, prefilter, indexed):
+    timings, full = [], 0
+    for query, where in zip(queries, filters):
+        search = table.search(query).limit(k).select(["id"])
+        if indexed:
+            search = search.nprobes(VECTOR_NPROBES).refine_factor(VECTOR_REFINE_FACTOR)
+        search = search.where(where.sql(), prefilter=prefilter)
+        start = time.perf_counter()
+        found = search.to_arrow().num_rows
+        timings.append(time.perf_counter() - start)
+        full += found == k
+    return timings, full / len(queries)
+
+
+def time_store(store, queries, filters, k):
+    timings, full = [], 0
+    for query, where in zip(queries, filters):
+        start = time.perf_counter()
+        found = len(store.search(query, k, where))
+        timings.append(time.perf_counter() - start)
+        full += found == k
+    return timings, full / len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--documents", type=int, default=1000)
+    parser.add_argument("--dimensions", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    projection = rng.standard_normal((32, args.dimensions), dtype=np.float32)
+    schema = documents_schema(args.dimensions)
+    pages = args.rows // args.documents
+    with tempfile.TemporaryDirectory() as directory:
+        store = LanceDBStore(uri=directory)
+        store.open(args.dimensions)
+        documents = store.table
+        for start in range(0, args.rows, 100_000):
+            vectors = random_vectors(min(100_000, args.rows - start), projection, rng)
+            rows = np.arange(start, start + len(vectors))
+            doc_ids = [f"doc-{i}" for i in rows % args.documents]
+            documents.add(
+                pa.table(
+                    {
+                        "vector": pa.FixedSizeListArray.from_arrays(
+                            pa.array(vectors.ravel()), args.dimensions
+                        ),
+                        "id": [str(i) for i in rows],
+                        "text": [""] * len(rows),
+                        "doc_id": doc_ids,
+                        "source": [f"data/{doc_id}.pdf" for doc_id in doc_ids],
+                        "page": rows // args.documents,
+                    },
+                    schema=schema,
+                )
+            )
+        indexed = args.rows >= VECTOR_INDEX_MIN_ROWS
+        if indexed:
+            documents.create_index(
+                metric="L2",
+                num_partitions=index_partitions(args.rows),
+                num_sub_vectors=index_sub_vectors(args.dimensions),
+                vector_column_name="vector",
+            )
+
+        queries = random_vectors(args.queries, projection, rng)
+        scoped = [f"doc-{i}" for i in rng.integers(args.documents, size=args.queries)]
+        scenarios = {
+            "document": [RowFilter(doc_ids=[doc_id]) for doc_id in scoped],
+            "document + pages": [
+                RowFilter(
+                    doc_ids=[doc_id],
+                    page_from=pages // 4,
+                    page_to=pages // 2,
+                )
+                for doc_id in scoped
+            ],
+        }
+        print(
+            f"{args.rows} rows, {args.documents} documents of {pages} pages,"
+            f" {'IVF_PQ' if indexed else 'no'} vector index"
+        )
+
+        table = PrettyTable(["filter", "search", "p50 ms", "p99 ms", "full"])
+        results = {}
+        for name, filters in scenarios.items():
+            for label, prefilter in (("post-filter", False), ("prefilter", True)):
+                results[name, label] = time_filtered(
+                    documents, queries, filters, args.k, prefilter, indexed
+                )
+        for column in SCALAR_INDEX_COLUMNS:
+            documents.create_scalar_index(column, replace=True)
+        for name, filters in scenarios.items():
+            results[name, "prefilter + BTREE"] = time_filtered(
+                documents, queries, filters, args.k, True, indexed
+            )
+            results[name, "LanceDBStore"] = time_store(store, queries, filters, args.k)
+
+        # Grouped by scope; sorted() keeps the search order within each
+        order = list(scenarios)
+        results = sorted(results.items(), key=lambda item: order.index(item[0][0]))
+        for (name, label), (timings, full) in results:
+            table.add_row(
+                [
+                    name,
+                    label,
+                    f"{percentile(timings, 0.5) * 1000:.1f}",
+                    f"{percentile(timings, 0.99) * 1000:.1f}",
+                    f"{full:.2f}",
+                ]
+            )
+    print(table)
+
+
+if __name__ == "__main__":
+    main()
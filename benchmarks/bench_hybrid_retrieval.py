@@ -0,0 +1,111 @@
+"""Recall@k and prompt tokens of dense, BM25 and hybrid (RRF) retrieval.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_hybrid_retrieval data \\
+        --questions benchmarks/grammar_questions.jsonl --k 1 2 3 5
+
+Questions and hits are as in bench_chunk_sweep: a query is a hit when one of
+its top k chunks contains the whole passage. The corpus is chunked with the
+default splitter, embedded with ``--provider`` and written through
+ChunkWriter, so the BM25 index is the one ingestion builds.
+"""
+
+import argparse
+import statistics
+import tempfile
+import time
+
+from langchain_core.documents import Document
+from prettytable import PrettyTable
+
+from benchmarks.bench_chunk_sweep import (
+    load_corpus,
+    load_questions,
+    normalize,
+    percentile,
+)
+from chunking import TiktokenTextSplitter, count_tokens
+from embeddings import create_embeddings
+from keyword_index import KeywordIndex
+from vector_store import ChunkWriter, DocumentsRetriever, LanceDBStore
+
+
+class KeywordRetriever(DocumentsRetriever):
+    # BM25 alone, for comparison
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        ids = [row["id"] for row in self.keywords.search(query, self.k)]
+        rows = {row["id"]: row for row in self.store.get(ids)}
+        return [Document(page_content=rows[i]["text"]) for i in ids if i in rows]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("corpus", nargs="?", default="data")
+    parser.add_argument("--questions", default="benchmarks/grammar_questions.jsonl")
+    parser.add_argument("--provider", default="hashing")
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 2, 3, 5])
+    parser.add_argument("--candidates", type=int, default=20)
+    args = parser.parse_args()
+
+    chunks = TiktokenTextSplitter().split_documents(load_corpus(args.corpus))
+    for chunk in chunks:
+        chunk.metadata["doc_id"] = str(chunk.metadata.get("source", ""))
+    questions = load_questions(args.questions)
+    passages = [normalize(question["passage"]) for question in questions]
+    embeddings = create_embeddings(args.provider)
+    print(
+        f"{args.corpus}: {len(chunks)} chunks, {len(questions)} questions,"
+        f" {args.provider} embeddings"
+    )
+
+    table = PrettyTable(
+        ["retrieval", "k", "recall@k", "prompt tokens", "p50 ms", "p95 ms"]
+    )
+    with tempfile.TemporaryDirectory() as directory:
+        store = LanceDBStore(uri=directory)
+        writer = ChunkWriter(store=store)
+        writer.keywords = KeywordIndex(f"{directory}/keywords")
+        writer.add(
+            chunks,
+            embeddings.embed_documents([chunk.page_content for chunk in chunks]),
+        )
+        for k in args.k:
+            retrievers = {
+                "dense": DocumentsRetriever(store=store, embeddings=embeddings, k=k),
+                "bm25": KeywordRetriever(
+                    store=store, embeddings=embeddings, k=k, keywords=writer.keywords
+                ),
+                "hybrid": DocumentsRetriever(
+                    store=store,
+                    embeddings=embeddings,
+                    k=k,
+                    keywords=writer.keywords,
+                    candidates=args.candidates,
+                ),
+            }
+            for name, retriever in retrievers.items():
+                hits, prompt_tokens, latencies = 0, [], []
+                for question, passage in zip(questions, passages):
+                    start = time.perf_counter()
+                    docs = retriever.invoke(question["question"])
+                    latencies.append(time.perf_counter() - start)
+                    retrieved = [doc.page_content for doc in docs]
+                    hits += any(passage in normalize(text) for text in retrieved)
+                    prompt_tokens.append(sum(count_tokens(retrieved)))
+                table.add_row(
+                    [
+                        name,
+                        k,
+                        f"{hits / len(questions):.2f}",
+                        f"{statistics.mean(prompt_tokens):.0f}",
+                        f"{percentile(latencies, 0.5) * 1000:.2f}",
+                        f"{percentile(latencies, 0.95) * 1000:.2f}",
+                    ]
+                )
+
+    print(table)
+
+
+if __name__ == "__main__":
+    main()
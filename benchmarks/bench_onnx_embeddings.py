@@ -0,0 +1,93 @@
+"""Local embedding throughput and agreement: PyTorch fp32 against ONNX fp32/int8.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_onnx_embeddings data --texts 512 --batch-size 32
+
+Chunks of the corpus are embedded by the sentence-transformers model in
+PyTorch and by its ONNX exports. Agreement is the cosine similarity of each
+ONNX vector with the PyTorch one, and recall@10 is the overlap of the top 10
+neighbours of every text among the others.
+"""
+
+import argparse
+import time
+
+import numpy as np
+from prettytable import PrettyTable
+
+from benchmarks.bench_chunk_sweep import load_corpus
+from chunking import TiktokenTextSplitter
+from local_embeddings import (
+    LOCAL_EMBEDDING_MODEL,
+    LocalEmbeddings,
+    OnnxEmbeddings,
+)
+
+
+def neighbours(vectors, k):
+    scores = vectors @ vectors.T
+    np.fill_diagonal(scores, -np.inf)
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("corpus", nargs="?", default="data")
+    parser.add_argument("--model", default=LOCAL_EMBEDDING_MODEL)
+    parser.add_argument("--texts", type=int, default=512)
+    parser.add_argument("--chunk-size", type=int, default=256)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--threads", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    splitter = TiktokenTextSplitter(chunk_size=args.chunk_size, chunk_overlap=0)
+    docs = splitter.split_documents(load_corpus(args.corpus))
+    texts = [doc.page_content for doc in docs][: args.texts]
+    print(f"{args.corpus}: {len(texts)} chunks of up to {args.chunk_size} tokens")
+
+    runtimes = {
+        "torch fp32": LocalEmbeddings(args.model, args.batch_size, args.threads),
+        "onnx fp32": OnnxEmbeddings(
+            args.model, args.batch_size, args.threads, quantize=False
+        ),
+        "onnx int8": OnnxEmbeddings(args.model, args.batch_size, args.threads),
+    }
+    table = PrettyTable(
+        ["runtime", "seconds", "texts/s", "speedup", "mean cos", "min cos", "recall@10"]
+    )
+    baseline = None
+    for name, embeddings in runtimes.items():
+        # The first call exports / loads the model and is not timed
+        embeddings.embed_documents(texts[:1])
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            vectors = np.asarray(embeddings.embed_documents(texts), dtype=np.float32)
+            timings.append(time.perf_counter() - start)
+        seconds = min(timings)
+        if baseline is None:
+            baseline = (seconds, vectors, neighbours(vectors, 10))
+        cosines = (vectors * baseline[1]).sum(axis=1)
+        found = neighbours(vectors, 10)
+        recall = np.mean(
+            [len(set(a) & set(b)) / len(a) for a, b in zip(found, baseline[2])]
+        )
+        table.add_row(
+            [
+                name,
+                f"{seconds:.2f}",
+                f"{len(texts) / seconds:.0f}",
+                f"{baseline[0] / seconds:.2f}x",
+                f"{cosines.mean():.4f}",
+                f"{cosines.min():.4f}",
+                f"{recall:.3f}",
+            ]
+        )
+
+    print(table)
+
+
+if __name__ == "__main__":
+    main()
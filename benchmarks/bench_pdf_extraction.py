@@ -0,0 +1,81 @@
+"""Page-level PDF extraction throughput against worker count.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_pdf_extraction data/grammar.pdf --workers 1 2 4 8
+"""
+
+import argparse
+import os
+import time
+
+from langchain_community.document_loaders import PyPDFLoader
+from prettytable import PrettyTable
+
+from extraction import (
+    count_pages,
+    extract_pdf_pages,
+    get_extract_executor,
+    shutdown_extract_executors,
+)
+
+
+def best_of(repeat, fn):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    cpus = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", nargs="?", default="data/grammar.pdf")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        nargs="+",
+        default=sorted({1, 2, 4, 8, cpus} & set(range(1, cpus + 1))),
+    )
+    parser.add_argument("--pages-per-task", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    pages = count_pages(args.path)
+    print(f"{args.path}: {pages} pages, {cpus} CPUs")
+
+    baseline, expected = best_of(args.repeat, lambda: PyPDFLoader(args.path).load())
+    table = PrettyTable(["extractor", "workers", "seconds", "pages/s", "speedup"])
+    table.add_row(
+        ["PyPDFLoader", 1, f"{baseline:.3f}", f"{pages / baseline:.1f}", "1.00x"]
+    )
+
+    for workers in args.workers:
+        if workers > 1:
+            # Pay the process start-up outside the timed runs, as a server would
+            get_extract_executor(workers).submit(count_pages, args.path).result()
+        seconds, docs = best_of(
+            args.repeat,
+            lambda: extract_pdf_pages(args.path, workers, args.pages_per_task),
+        )
+        assert [doc.page_content for doc in docs] == [
+            doc.page_content for doc in expected
+        ], "parallel extraction changed the page text or order"
+        table.add_row(
+            [
+                "extract_pdf_pages",
+                workers,
+                f"{seconds:.3f}",
+                f"{pages / seconds:.1f}",
+                f"{baseline / seconds:.2f}x",
+            ]
+        )
+
+    shutdown_extract_executors()
+    print(table)
+
+
+if __name__ == "__main__":
+    main()
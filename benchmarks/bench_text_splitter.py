@@ -0,0 +1,77 @@
+"""Text splitting throughput of the langchain splitter against the single-pass one.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_text_splitter data/grammar.pdf --chunk-sizes 200 1000 4000
+"""
+
+import argparse
+import time
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from prettytable import PrettyTable
+
+from chunking import FastRecursiveTextSplitter
+from extraction import extract_pdf_pages
+
+
+def best_of(repeat, fn):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", nargs="?", default="data/grammar.pdf")
+    parser.add_argument("--chunk-sizes", type=int, nargs="+", default=[200, 1000, 4000])
+    parser.add_argument("--overlap", type=float, default=0.2)
+    parser.add_argument(
+        "--copies", type=int, default=1, help="repeat the text to simulate a corpus"
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    pages = [doc.page_content for doc in extract_pdf_pages(args.path)]
+    text = "\n\n".join(pages * args.copies)
+    megabytes = len(text.encode("utf-8")) / 1024**2
+    print(f"{args.path}: {len(pages)} pages x {args.copies}, {megabytes:.2f} MiB")
+
+    table = PrettyTable(["chunk_size", "splitter", "chunks", "seconds", "MiB/s"])
+    for chunk_size in args.chunk_sizes:
+        overlap = int(chunk_size * args.overlap)
+        baseline, expected = best_of(
+            args.repeat,
+            lambda: RecursiveCharacterTextSplitter(
+                chunk_size=chunk_size, chunk_overlap=overlap
+            ).split_text(text),
+        )
+        seconds, chunks = best_of(
+            args.repeat,
+            lambda: FastRecursiveTextSplitter(
+                chunk_size=chunk_size, chunk_overlap=overlap
+            ).split_text(text),
+        )
+        assert chunks == expected, "single-pass splitter changed the chunks"
+        for name, timing in [
+            ("RecursiveCharacterTextSplitter", baseline),
+            (f"FastRecursiveTextSplitter ({baseline / seconds:.2f}x)", seconds),
+        ]:
+            table.add_row(
+                [
+                    chunk_size,
+                    name,
+                    len(expected),
+                    f"{timing:.3f}",
+                    f"{megabytes / timing:.1f}",
+                ]
+            )
+
+    print(table)
+
+
+if __name__ == "__main__":
+    main()
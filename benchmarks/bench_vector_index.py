@@ -0,0 +1,125 @@
+"""Search latency and recall of a brute-force scan against an IVF_PQ index.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_vector_index --rows 10000 100000 1000000 \\
+        --dimensions 768 --queries 200 --nprobes 50 --refine-factor 10
+
+Each size gets a temporary LanceDB table of L2-normalised random vectors
+with a low intrinsic dimension, like real embeddings. Queries are timed
+before and after the index is built the way VectorIndexManager builds it.
+Recall@k is measured against the exact scan.
+"""
+
+import argparse
+import tempfile
+import time
+
+import lancedb
+import numpy as np
+import pyarrow as pa
+from prettytable import PrettyTable
+
+from benchmarks.bench_chunk_sweep import percentile
+from vector_index import index_partitions, index_sub_vectors
+from vector_store import documents_schema
+
+
+def random_vectors(rows, projection, rng, noise=0.5):
+    # Embeddings vary along far fewer directions than they have dimensions
+    latent = rng.standard_normal((rows, len(projection)), dtype=np.float32)
+    vectors = latent @ projection
+    vectors += noise * rng.standard_normal(vectors.shape, dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def time_queries(table, queries, k, nprobes=None, refine_factor=None):
+    timings, results = [], []
+    for query in queries:
+        search = table.search(query).limit(k).select(["id"])
+        if nprobes:
+            search = search.nprobes(nprobes).refine_factor(refine_factor)
+        start = time.perf_counter()
+        ids = search.to_arrow()["id"].to_pylist()
+        timings.append(time.perf_counter() - start)
+        results.append(set(ids))
+    return timings, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--dimensions", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--nprobes", type=int, default=50)
+    parser.add_argument("--refine-factor", type=int, default=10)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    projection = rng.standard_normal((32, args.dimensions), dtype=np.float32)
+    schema = documents_schema(args.dimensions)
+    table = PrettyTable(
+        [
+            "rows",
+            "scan p50 ms",
+            "scan p99 ms",
+            "build s",
+            "index p50 ms",
+            "index p99 ms",
+            f"recall@{args.k}",
+        ]
+    )
+    for rows in args.rows:
+        with tempfile.TemporaryDirectory() as directory:
+            documents = lancedb.connect(directory).create_table("bench", schema=schema)
+            for start in range(0, rows, 100_000):
+                vectors = random_vectors(min(100_000, rows - start), projection, rng)
+                ids = [str(i) for i in range(start, start + len(vectors))]
+                documents.add(
+                    pa.table(
+                        {
+                            "vector": pa.FixedSizeListArray.from_arrays(
+                                pa.array(vectors.ravel()), args.dimensions
+                            ),
+                            "id": ids,
+                            "text": ids,
+                            "doc_id": ids,
+                            "source": [""] * len(ids),
+                            "page": [-1] * len(ids),
+                        },
+                        schema=schema,
+                    )
+                )
+            queries = random_vectors(args.queries, projection, rng)
+            scan, exact = time_queries(documents, queries, args.k)
+
+            start = time.perf_counter()
+            documents.create_index(
+                metric="L2",
+                num_partitions=index_partitions(rows),
+                num_sub_vectors=index_sub_vectors(args.dimensions),
+                vector_column_name="vector",
+            )
+            build = time.perf_counter() - start
+            indexed, found = time_queries(
+                documents, queries, args.k, args.nprobes, args.refine_factor
+            )
+            recall = np.mean([len(a & b) / args.k for a, b in zip(exact, found)])
+            table.add_row(
+                [
+                    rows,
+                    f"{percentile(scan, 0.5) * 1000:.1f}",
+                    f"{percentile(scan, 0.99) * 1000:.1f}",
+                    f"{build:.1f}",
+                    f"{percentile(indexed, 0.5) * 1000:.1f}",
+                    f"{percentile(indexed, 0.99) * 1000:.1f}",
+                    f"{recall:.3f}",
+                ]
+            )
+
+    print(table)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+"""Build time, memory, disk size, QPS and recall@k of each vector-store backend.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_vector_stores data --synthetic 100000 \\
+        --backends lancedb faiss-flat faiss-ivf faiss-hnsw chroma --k 3
+
+The corpus is chunked and embedded once with ``--provider`` (the offline
+hashing provider by default). It is then padded with ``--synthetic`` random
+vectors of low intrinsic dimension, so the benchmark can reach deployment
+sizes. Every backend indexes the same rows in a process of its own, so peak
+memory is its own. Recall@k is measured against the exact neighbours.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+
+import numpy as np
+from prettytable import PrettyTable
+
+from benchmarks.bench_chunk_sweep import directory_size, load_corpus, percentile
+from benchmarks.bench_vector_index import random_vectors
+from chunking import TiktokenTextSplitter
+from embeddings import create_embeddings
+
+ADD_BATCH_SIZE = 1000
+
+
+def make_store(backend, directory):
+    from tenants import DEFAULT_TENANT
+    from vector_store import LanceDBStore
+
+    if backend == "lancedb":
+        return LanceDBStore(uri=directory)
+    if backend.startswith("faiss-"):
+        from faiss_store import FaissStore
+
+        return FaissStore(kind=backend.split("-", 1)[1], directory=directory)
+    if backend == "chroma":
+        from chroma_store import ChromaStore, get_chroma_client
+
+        return ChromaStore(DEFAULT_TENANT, get_chroma_client(directory))
+    raise ValueError(f"Unknown backend {backend!r}.")
+
+
+def run_backend(backend, workdir, args, results):
+    from vector_index import VectorIndexManager
+    from vector_store import index_manager, tenant_table
+
+    # The benchmark builds the LanceDB indexes itself, synchronously
+    index_manager.min_rows = index_manager.scalar_min_rows = float("inf")
+
+    vectors = np.load(os.path.join(workdir, "vectors.npy"), mmap_mode="r")
+    queries = np.load(os.path.join(workdir, "queries.npy"))
+    with open(os.path.join(workdir, "rows.jsonl"), encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f]
+    directory = os.path.join(workdir, backend)
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    store = make_store(backend, directory)
+    start = time.perf_counter()
+    store.open(vectors.shape[1])
+    for offset in range(0, len(rows), ADD_BATCH_SIZE):
+        batch = rows[offset : offset + ADD_BATCH_SIZE]
+        for row, vector in zip(batch, vectors[offset : offset + ADD_BATCH_SIZE]):
+            row["vector"] = vector.tolist()
+        store.add(batch)
+    if backend == "lancedb":
+        VectorIndexManager(min_rows=args.index_min_rows).run(
+            directory, tenant_table(), store.table.checkout_latest
+        )
+    build = time.perf_counter() - start
+
+    timings, found = [], []
+    for query in queries:
+        start = time.perf_counter()
+        hits = store.search(query, args.k)
+        timings.append(time.perf_counter() - start)
+        found.append([hit["id"] for hit in hits])
+    results.put(
+        {
+            "build": build,
+            "memory": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline,
+            "disk": directory_size(directory),
+            "timings": timings,
+            "found": found,
+        }
+    )
+
+
+def exact_neighbours(vectors, queries, k, step=100_000):
+    best = np.empty((len(queries), 0), dtype=np.int64)
+    best_distances = np.empty((len(queries), 0), dtype=np.float32)
+    for start in range(0, len(vectors), step):
+        block = np.asarray(vectors[start : start + step])
+        distances = (
+            (queries**2).sum(axis=1)[:, None]
+            - 2 * queries @ block.T
+            + (block**2).sum(axis=1)[None, :]
+        )
+        candidates = np.concatenate([best_distances, distances], axis=1)
+        ids = np.concatenate(
+            [
+                best,
+                np.broadcast_to(np.arange(start, start + len(block)), distances.shape),
+            ],
+            axis=1,
+        )
+        order = np.argsort(candidates, axis=1)[:, :k]
+        best = np.take_along_axis(ids, order, axis=1)
+        best_distances = np.take_along_axis(candidates, order, axis=1)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("corpus", nargs="?", default="data")
+    parser.add_argument("--provider", default="hashing")
+    parser.add_argument("--synthetic", type=int, default=20_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--index-min-rows", type=int, default=10_000)
+    parser.add_argument(
+        "--backends",
+        nargs="+",
+        default=["lancedb", "faiss-flat", "faiss-ivf", "faiss-hnsw", "chroma"],
+    )
+    args = parser.parse_args()
+
+    chunks = TiktokenTextSplitter().split_documents(load_corpus(args.corpus))
+    embeddings = create_embeddings(args.provider)
+    vectors = np.asarray(
+        embeddings.embed_documents([chunk.page_content for chunk in chunks]),
+        dtype=np.float32,
+    )
+    rows = [
+        {
+            "id": f"corpus-{i}",
+            "text": chunk.page_content,
+            "doc_id": str(chunk.metadata.get("source", "")),
+            "source": str(chunk.metadata.get("source", "")),
+            "page": int(chunk.metadata.get("page", -1)),
+        }
+        for i, chunk in enumerate(chunks)
+    ]
+    rng = np.random.default_rng(0)
+    projection = rng.standard_normal((32, vectors.shape[1]), dtype=np.float32)
+    if args.synthetic:
+        vectors = np.concatenate(
+            [vectors, random_vectors(args.synthetic, projection, rng)]
+        )
+        rows.extend(
+            {
+                "id": f"synthetic-{i}",
+                "text": f"synthetic row {i}",
+                "doc_id": f"synthetic-{i // 100}",
+                "source": "",
+                "page": -1,
+            }
+            for i in range(args.synthetic)
+        )
+    # Queries are perturbed copies of stored rows
+    queries = vectors[rng.integers(len(vectors), size=args.queries)]
+    queries = queries + 0.05 * rng.standard_normal(queries.shape, dtype=np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    exact = exact_neighbours(vectors, queries, args.k)
+    exact_ids = [{rows[i]["id"] for i in ids} for ids in exact]
+    print(
+        f"{args.corpus}: {len(chunks)} chunks + {args.synthetic} synthetic rows,"
+        f" {vectors.shape[1]} dimensions, {args.queries} queries"
+    )
+
+    table = PrettyTable(
+        [
+            "backend",
+            "build s",
+            "peak MiB",
+            "disk MiB",
+            "QPS",
+            "p50 ms",
+            "p99 ms",
+            f"recall@{args.k}",
+        ]
+    )
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as workdir:
+        np.save(os.path.join(workdir, "vectors.npy"), vectors)
+        np.save(os.path.join(workdir, "queries.npy"), queries)
+        with open(os.path.join(workdir, "rows.jsonl"), "w", encoding="utf-8") as f:
+            f.writelines(json.dumps(row) + "\n" for row in rows)
+
+        for backend in args.backends:
+            results = context.Queue()
+            process = context.Process(
+                target=run_backend, args=(backend, workdir, args, results)
+            )
+            process.start()
+            result = results.get()
+            process.join()
+            recall = np.mean(
+                [
+                    len(expected & set(found)) / args.k
+                    for expected, found in zip(exact_ids, result["found"])
+                ]
+            )
+            table.add_row(
+                [
+                    backend,
+                    f"{result['build']:.1f}",
+                    f"{result['memory'] / 1024:.0f}",
+                    f"{result['disk'] / 1024**2:.1f}",
+                    f"{len(queries) / sum(result['timings']):.0f}",
+                    f"{percentile(result['timings'], 0.5) * 1000:.2f}",
+                    f"{percentile(result['timings'], 0.99) * 1000:.2f}",
+                    f"{recall:.3f}",
+                ]
+            )
+
+    print(table)
+
+
+if __name__ == "__main__":
+    main()
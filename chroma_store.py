@@ -0,0 +1,123 @@
+import functools
+import hashlib
+import os
+import re
+
+from tenants import DEFAULT_TENANT
+from vector_store import VectorStore, tenant_table
+
+CHROMA_DIR = os.getenv("CHROMA_DIR", "src/chroma")
+
+# 3 to 63 characters that start and end alphanumeric, without ".."
+_collection_name = re.compile(r"(?!.*\.\.)[A-Za-z0-9][\w.-]{1,61}[A-Za-z0-9]", re.ASCII)
+
+
+@functools.lru_cache(maxsize=None)
+def get_chroma_client(path=CHROMA_DIR):
+    import chromadb
+    from chromadb.config import Settings
+
+    return chromadb.PersistentClient(
+        path=path, settings=Settings(anonymized_telemetry=False)
+    )
+
+
+def collection_name(tenant=DEFAULT_TENANT):
+    """``tenant_table(tenant)``, or a hash of it when Chroma would reject it."""
+    name = tenant_table(tenant)
+    if _collection_name.fullmatch(name):
+        return name
+    return "tenant-" + hashlib.sha256(name.encode("utf-8")).hexdigest()[:32]
+
+
+def chroma_where(where):
+    """A RowFilter as a Chroma ``where`` clause, or None."""
+    if where is None:
+        return None
+    clauses = []
+    if where.doc_ids is not None:
+        clauses.append({"doc_id": {"$in": where.doc_ids}})
+    if where.page_from is not None:
+        clauses.append({"page": {"$gte": int(where.page_from)}})
+    if where.page_to is not None:
+        clauses.append({"page": {"$lte": int(where.page_to)}})
+    if len(clauses) > 1:
+        return {"$and": clauses}
+    return clauses[0] if clauses else None
+
+
+class ChromaStore(VectorStore):
+    """One Chroma collection per tenant, named by ``collection_name``."""
+
+    def __init__(self, tenant=DEFAULT_TENANT, client=None):
+        self.name = collection_name(tenant)
+        self.client = client or get_chroma_client()
+        self._collection = None
+
+    @property
+    def collection(self):
+        if self._collection is None:
+            # Squared L2, the distance the other backends report
+            self._collection = self.client.get_or_create_collection(
+                self.name, metadata={"hnsw:space": "l2"}
+            )
+        return self._collection
+
+    def open(self, dimensions):
+        self.collection
+
+    def add(self, rows):
+        step = self.client.max_batch_size
+        for start in range(0, len(rows), step):
+            batch = rows[start : start + step]
+            self.collection.upsert(
+                ids=[row["id"] for row in batch],
+                embeddings=[list(map(float, row["vector"])) for row in batch],
+                documents=[row["text"] for row in batch],
+                metadatas=[
+                    {name: row[name] for name in ("doc_id", "source", "page")}
+                    for row in batch
+                ],
+            )
+        return len(rows)
+
+    def delete(self, doc_ids):
+        if doc_ids:
+            self.collection.delete(where={"doc_id": {"$in": list(doc_ids)}})
+
+    def has_document(self, doc_id):
+        found = self.collection.get(where={"doc_id": doc_id}, limit=1, include=[])
+        return bool(found["ids"])
+
+    def count(self):
+        return self.collection.count()
+
+    def get(self, ids):
+        if not ids:
+            return []
+        found = self.collection.get(ids=list(ids), include=["documents", "metadatas"])
+        return [
+            {"id": row_id, "text": text, **metadata}
+            for row_id, text, metadata in zip(
+                found["ids"], found["documents"], found["metadatas"]
+            )
+        ]
+
+    def search(self, vector, k, where=None):
+        results = self.collection.query(
+            query_embeddings=[list(map(float, vector))],
+            n_results=k,
+            where=chroma_where(where),
+            include=["documents", "metadatas", "distances"],
+        )
+        rows = zip(
+            results["ids"][0],
+            results["documents"][0],
+            results["metadatas"][0],
+            results["distances"][0],
+        )
+        # Chroma can return more than n_results once rows have been deleted
+        return [
+            {"id": row_id, "text": text, **metadata, "_distance": distance}
+            for row_id, text, metadata, distance in list(rows)[:k]
+        ]
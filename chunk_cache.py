@@ -0,0 +1,149 @@
+import hashlib
+import os
+import threading
+import time
+
+import numpy as np
+from langchain_core.documents import Document
+
+from sqlite_db import connect
+
+CHUNK_CACHE_PATH = os.getenv("CHUNK_CACHE_PATH", "src/chunk_cache.sqlite")
+CHUNK_CACHE_MAX_ENTRIES = int(os.getenv("CHUNK_CACHE_MAX_ENTRIES", 500_000))
+
+
+def text_sha256(text):
+    return hashlib.sha256(text.encode("utf-8", errors="surrogatepass")).hexdigest()
+
+
+def chunk_spans(text, chunks):
+    """``(start, end)`` of each chunk in ``text``, or None if one is not a slice.
+
+    Chunks come out of a splitter in text order, so each one is searched for
+    from where the previous one starts.
+    """
+    spans, position = [], 0
+    for chunk in chunks:
+        start = text.find(chunk, position)
+        if start < 0:
+            return None
+        spans.append((start, start + len(chunk)))
+        position = start
+    return spans
+
+
+class ChunkCache:
+    """Chunk boundaries per (text hash, splitter configuration).
+
+    An entry holds the start and end offsets of every chunk as int64 arrays
+    (and the chunks' token counts when the splitter reports them), never the
+    chunk text. Each page is its own small entry, so they live in one SQLite
+    file rather than a file each; the least recently used entries beyond
+    ``max_entries`` are evicted.
+    """
+
+    def __init__(self, path=CHUNK_CACHE_PATH, max_entries=CHUNK_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._db = None
+
+    def _connect(self):
+        if self._db is None:
+            # Losing the last few entries in a crash only costs a re-split
+            db = connect(self.path)
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS chunks ("
+                "text_sha256 TEXT, splitter TEXT, starts BLOB, ends BLOB,"
+                " token_counts BLOB, used REAL,"
+                " PRIMARY KEY (text_sha256, splitter))"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS chunks_used ON chunks (used)")
+            self._db = db
+        return self._db
+
+    def get(self, sha256, splitter):
+        """Return ``(starts, ends, token_counts)`` or None on a miss."""
+        with self._lock:
+            db = self._connect()
+            row = db.execute(
+                "SELECT starts, ends, token_counts FROM chunks"
+                " WHERE text_sha256 = ? AND splitter = ?",
+                (sha256, splitter),
+            ).fetchone()
+            if row is None:
+                return None
+            db.execute(
+                "UPDATE chunks SET used = ? WHERE text_sha256 = ? AND splitter = ?",
+                (time.time(), sha256, splitter),
+            )
+        starts, ends, token_counts = row
+        return (
+            np.frombuffer(starts, dtype=np.int64),
+            np.frombuffer(ends, dtype=np.int64),
+            None if token_counts is None else np.frombuffer(token_counts, np.int32),
+        )
+
+    def put(self, sha256, splitter, starts, ends, token_counts=None):
+        if token_counts is not None:
+            token_counts = np.asarray(token_counts, dtype=np.int32).tobytes()
+        with self._lock:
+            self._connect().execute(
+                "INSERT OR REPLACE INTO chunks VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    sha256,
+                    splitter,
+                    np.asarray(starts, dtype=np.int64).tobytes(),
+                    np.asarray(ends, dtype=np.int64).tobytes(),
+                    token_counts,
+                    time.time(),
+                ),
+            )
+
+    def evict(self):
+        with self._lock:
+            db = self._connect()
+            (count,) = db.execute("SELECT COUNT(*) FROM chunks").fetchone()
+            if count > self.max_entries:
+                db.execute(
+                    "DELETE FROM chunks WHERE rowid IN"
+                    " (SELECT rowid FROM chunks ORDER BY used LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+
+
+def iter_cached_chunks(cache, splitter, docs):
+    """Yield the chunks of each Document, splitting only on a cache miss.
+
+    A hit slices the chunks straight out of the page text, so a repeated
+    split costs a hash and a lookup. Entries are keyed by the splitter's
+    ``cache_key()``, so changing chunk_size, chunk_overlap, the encoding or the
+    splitter version only misses for that configuration.
+    """
+    key = splitter.cache_key()
+    for doc in docs:
+        text = doc.page_content
+        sha256 = text_sha256(text)
+        entry = cache.get(sha256, key)
+        if entry is None:
+            chunks = splitter.split_documents([doc])
+            spans = chunk_spans(text, [chunk.page_content for chunk in chunks])
+            if spans is not None:
+                token_counts = [chunk.metadata.get("token_count") for chunk in chunks]
+                cache.put(
+                    sha256,
+                    key,
+                    [start for start, _ in spans],
+                    [end for _, end in spans],
+                    None if None in token_counts else token_counts,
+                )
+            yield from chunks
+            continue
+
+        starts, ends, token_counts = entry
+        for index, (start, end) in enumerate(zip(starts.tolist(), ends.tolist())):
+            metadata = dict(doc.metadata)
+            if token_counts is not None:
+                metadata["token_count"] = int(token_counts[index])
+            yield Document(page_content=text[start:end], metadata=metadata)
+    cache.evict()
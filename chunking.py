@@ -0,0 +1,279 @@
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import tiktoken
+from langchain.text_splitter import TextSplitter
+
+CHUNK_ENCODING = os.getenv("CHUNK_ENCODING", "cl100k_base")
+CHUNK_SIZE_TOKENS = int(os.getenv("CHUNK_SIZE_TOKENS", 512))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", 64))
+TOKEN_COUNT_THREADS = int(os.getenv("TOKEN_COUNT_THREADS", 4))
+TOKEN_COUNT_PARALLEL_MIN = 512
+
+_token_count_pool = ThreadPoolExecutor(
+    max_workers=TOKEN_COUNT_THREADS, thread_name_prefix="tiktoken"
+)
+
+
+@functools.lru_cache(maxsize=None)
+def get_encoding(name=CHUNK_ENCODING):
+    return tiktoken.get_encoding(name)
+
+
+def _count_slice(encoding, texts):
+    return [len(encoding.encode_ordinary(text)) for text in texts]
+
+
+def count_tokens(texts, encoding_name=CHUNK_ENCODING):
+    # tiktoken releases the GIL while encoding, so large batches are spread over a
+    # shared pool; Encoding.encode_ordinary_batch would start a new pool per call
+    encoding = get_encoding(encoding_name)
+    texts = list(texts)
+    if len(texts) < TOKEN_COUNT_PARALLEL_MIN:
+        return _count_slice(encoding, texts)
+    step = -(-len(texts) // TOKEN_COUNT_THREADS)
+    slices = [texts[i : i + step] for i in range(0, len(texts), step)]
+    counts = _token_count_pool.map(functools.partial(_count_slice, encoding), slices)
+    return [count for part in counts for count in part]
+
+
+class FastRecursiveTextSplitter(TextSplitter):
+    """Single-pass equivalent of RecursiveCharacterTextSplitter.
+
+    Produces the same chunks as ``RecursiveCharacterTextSplitter`` with its
+    default separators (paragraph, line, space, character) and
+    ``keep_separator=True``. Every paragraph, line and space boundary is found
+    in one vectorised scan. The separator fallback then refines all oversized
+    pieces of a level at once as offset arrays, and chunks are packed from
+    cumulative lengths, so the only strings built are the chunks themselves.
+    """
+
+    # Bump when a change to the algorithm moves chunk boundaries
+    version = "1"
+
+    def __init__(self, chunk_size=4000, chunk_overlap=200, **kwargs):
+        kwargs.setdefault("keep_separator", True)
+        if not kwargs["keep_separator"]:
+            raise ValueError("FastRecursiveTextSplitter requires keep_separator")
+        super().__init__(chunk_size=chunk_size, chunk_overlap=chunk_overlap, **kwargs)
+
+    def cache_key(self):
+        """Identify the configuration whose chunks a ChunkCache entry holds."""
+        return (
+            f"{type(self).__name__}-{self._chunk_size}-{self._chunk_overlap}"
+            f"-v{self.version}"
+        )
+
+    @staticmethod
+    def boundaries(text):
+        """Yield the offsets of the "\\n\\n", "\\n" and " " matches re.split would use.
+
+        Levels are computed on demand, so the space offsets are only found if
+        a piece is still too long after splitting on lines.
+        """
+        if text.isascii():
+            codes = np.frombuffer(text.encode("ascii"), dtype=np.uint8)
+        else:
+            codes = np.frombuffer(
+                text.encode("utf-32-le", errors="surrogatepass"), dtype=np.uint32
+            )
+        lines = np.flatnonzero(codes == 0x0A)
+        # "\\n\\n" matches a run of newlines at every second offset from its start
+        joined = np.zeros(len(lines), dtype=bool)
+        joined[1:] = lines[1:] == lines[:-1] + 1
+        offsets = lines - np.maximum.accumulate(np.where(joined, 0, lines))
+        followed = np.zeros_like(joined)
+        followed[:-1] = joined[1:]
+        yield lines[(offsets % 2 == 0) & followed]
+        yield lines
+        yield np.flatnonzero(codes == 0x20)
+
+    def _lengths(self, text, starts, ends):
+        if self._length_function is len:
+            return ends - starts
+        return np.array(
+            [self._length_function(text[a:b]) for a, b in zip(starts, ends)],
+            dtype=np.int64,
+        )
+
+    def split_text(self, text):
+        segment_starts, segment_ends = np.array([0]), np.array([len(text)])
+        starts, ends, lengths, groups = [], [], [], []
+        next_group = 0
+        for positions in self.boundaries(text):
+            if not len(segment_starts):
+                break
+            # Segments without this separator fall through to the next one
+            low = positions.searchsorted(segment_starts)
+            high = positions.searchsorted(segment_ends)
+            present = high > low
+            if not present.any():
+                continue
+            skipped = segment_starts[~present], segment_ends[~present]
+            segment_starts, segment_ends = (
+                segment_starts[present],
+                segment_ends[present],
+            )
+            low, high = low[present], high[present]
+
+            # With keep_separator every piece starts at a separator match
+            segment = np.arange(len(segment_starts))
+            inner = positions[_concat_ranges(low, high)]
+            inner_segment = np.repeat(segment, high - low)
+            interior = inner > segment_starts[inner_segment]
+            piece_starts = np.concatenate((segment_starts, inner[interior]))
+            piece_segment = np.concatenate((segment, inner_segment[interior]))
+            order = piece_starts.argsort(kind="stable")
+            piece_starts, piece_segment = piece_starts[order], piece_segment[order]
+            last = np.concatenate((piece_segment[1:] != piece_segment[:-1], [True]))
+            piece_ends = np.concatenate((piece_starts[1:], [0]))
+            piece_ends[last] = segment_ends[piece_segment[last]]
+
+            piece_lengths = self._lengths(text, piece_starts, piece_ends)
+            oversized = piece_lengths >= self._chunk_size
+            # Runs of pieces that fit are packed separately, as in _split_text
+            new_run = np.concatenate(([True], last[:-1] | oversized[:-1]))
+            run = next_group + np.cumsum(new_run) - 1
+            next_group += int(new_run.sum())
+            fits = ~oversized
+            starts.append(piece_starts[fits])
+            ends.append(piece_ends[fits])
+            lengths.append(piece_lengths[fits])
+            groups.append(run[fits])
+
+            segment_starts = np.concatenate((piece_starts[oversized], skipped[0]))
+            segment_ends = np.concatenate((piece_ends[oversized], skipped[1]))
+
+        # No separator left: the character level works per segment
+        pieces = {
+            start: self._split_characters(text, start, end)
+            for start, end in zip(segment_starts.tolist(), segment_ends.tolist())
+        }
+        starts.append(segment_starts)
+        ends.append(segment_ends)
+        lengths.append(np.zeros(len(segment_starts), dtype=np.int64))
+        groups.append(next_group + np.arange(len(segment_starts)))
+        return self._pack(
+            text,
+            *(np.concatenate(parts) for parts in (starts, ends, lengths, groups)),
+            pieces,
+        )
+
+    def _split_characters(self, text, start, end):
+        starts = np.arange(start, end)
+        ends = starts + 1
+        lengths = self._lengths(text, starts, ends)
+        oversized = lengths >= self._chunk_size
+        # Characters at least chunk_size long are kept as they are
+        pieces = {start: [text[start]] for start in starts[oversized].tolist()}
+        groups = np.cumsum(np.concatenate(([True], oversized[:-1] | oversized[1:])))
+        lengths[oversized] = 0
+        return self._pack(text, starts, ends, lengths, groups, pieces)
+
+    def _pack(self, text, starts, ends, lengths, groups, pieces):
+        """Greedily merge each group of contiguous pieces into chunks.
+
+        This is TextSplitter._merge_splits with an empty separator: the pieces
+        of a group are contiguous, so every chunk is a single slice. For each
+        piece the point where a chunk starting there overflows, and how much
+        overlap is carried past it, are found up front with searchsorted.
+        ``pieces`` maps the start of a piece to chunks produced elsewhere.
+        """
+        order = starts.argsort(kind="stable")
+        starts, ends = starts[order], ends[order]
+        lengths, groups = lengths[order], groups[order]
+
+        total = np.concatenate(([0], np.cumsum(lengths)))
+        overflow = total.searchsorted(total[:-1] + self._chunk_size, "right") - 1
+        keep = np.maximum(
+            total.searchsorted(total[:-1] - self._chunk_overlap),
+            np.minimum(
+                total.searchsorted(total[1:] - self._chunk_size),
+                total.searchsorted(total[:-1]),
+            ),
+        )
+        group_ends = np.concatenate(
+            (np.flatnonzero(np.diff(groups)) + 1, [len(groups)])
+        )
+        group_ends = np.repeat(group_ends, np.diff(group_ends, prepend=0))
+
+        starts, ends = starts.tolist(), ends.tolist()
+        overflow, keep, group_ends = (
+            overflow.tolist(),
+            keep.tolist(),
+            group_ends.tolist(),
+        )
+        chunks, first = [], 0
+        while first < len(starts):
+            start = starts[first]
+            if start in pieces:
+                chunks.extend(pieces[start])
+                first += 1
+                continue
+            stop, end = overflow[first], group_ends[first]
+            if stop < end:
+                chunk = text[start : starts[stop]]
+                first = max(first, keep[stop])
+            else:
+                chunk = text[start : ends[end - 1]]
+                first = end
+            if self._strip_whitespace:
+                chunk = chunk.strip()
+            if chunk:
+                chunks.append(chunk)
+        return chunks
+
+
+def _concat_ranges(low, high):
+    """``np.concatenate([np.arange(l, h) for l, h in zip(low, high)])``"""
+    counts = high - low
+    return np.arange(counts.sum()) + np.repeat(low - np.cumsum(counts) + counts, counts)
+
+
+class TiktokenTextSplitter(FastRecursiveTextSplitter):
+    """FastRecursiveTextSplitter whose chunk_size and chunk_overlap are tokens.
+
+    The pieces of each recursion level are counted as one batch instead of one
+    call per piece, and every chunk gets its ``token_count`` in metadata.
+    """
+
+    def __init__(
+        self,
+        chunk_size=CHUNK_SIZE_TOKENS,
+        chunk_overlap=CHUNK_OVERLAP_TOKENS,
+        encoding_name=CHUNK_ENCODING,
+        **kwargs,
+    ):
+        super().__init__(chunk_size=chunk_size, chunk_overlap=chunk_overlap, **kwargs)
+        self._encoding_name = encoding_name
+        self._encoding = get_encoding(encoding_name)
+
+    def cache_key(self):
+        return f"{super().cache_key()}-{self._encoding_name}"
+
+    def _lengths(self, text, starts, ends):
+        pieces = [text[a:b] for a, b in zip(starts.tolist(), ends.tolist())]
+        return np.array(count_tokens(pieces, self._encoding_name), dtype=np.int64)
+
+    def _split_characters(self, text, start, end):
+        # No separator left: cut fixed token windows, as TokenTextSplitter does
+        tokens = self._encoding.encode_ordinary(text[start:end])
+        step = max(self._chunk_size - self._chunk_overlap, 1)
+        chunks = []
+        for first in range(0, len(tokens), step):
+            chunk = self._encoding.decode(tokens[first : first + self._chunk_size])
+            chunk = chunk.strip() if self._strip_whitespace else chunk
+            if chunk:
+                chunks.append(chunk)
+            if first + self._chunk_size >= len(tokens):
+                break
+        return chunks
+
+    def create_documents(self, texts, metadatas=None):
+        documents = super().create_documents(texts, metadatas)
+        counts = count_tokens([doc.page_content for doc in documents])
+        for doc, count in zip(documents, counts):
+            doc.metadata["token_count"] = count
+        return documents
@@ -0,0 +1,169 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+import aiofiles
+import aiofiles.os
+
+from fileutils import write_json_atomic
+from tenants import DEFAULT_TENANT, check_tenant
+
+DATA_DIR = os.getenv("DATA_DIR", "data")
+DOCUMENT_MANIFEST = os.getenv("DOCUMENT_MANIFEST", "src/documents.json")
+# Uploads of other tenants stay out of DATA_DIR, which the default tenant syncs
+TENANTS_DIR = os.getenv("TENANTS_DIR", "src/tenants")
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", 1024 * 1024))
+
+
+async def stream_upload_to_temp(file, dest_dir, chunk_size=UPLOAD_CHUNK_SIZE):
+    # The temp file lives in dest_dir so the final rename stays on one filesystem
+    os.makedirs(dest_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=dest_dir, prefix=".upload-", suffix=".part")
+    os.close(fd)
+
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async with aiofiles.open(tmp_path, "wb") as out:
+            while True:
+                block = await file.read(chunk_size)
+                if not block:
+                    break
+                digest.update(block)
+                size += len(block)
+                await out.write(block)
+    except BaseException:
+        await aiofiles.os.remove(tmp_path)
+        raise
+
+    return tmp_path, digest.hexdigest(), size
+
+
+class DocumentStore:
+    """Content-addressed store: each file is saved once as data/<sha256><ext>.
+
+    The manifest maps the content hash (which doubles as the document id) to
+    the original upload names and file metadata. ``indexed_at`` is only set
+    once ingestion has written all of a document's chunks.
+    """
+
+    def __init__(self, root=DATA_DIR, manifest_path=DOCUMENT_MANIFEST):
+        self.root = root
+        self.manifest_path = manifest_path
+        self._lock = threading.Lock()
+        self._documents = self._load_manifest()
+
+    def _load_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return {}
+        with open(self.manifest_path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def get(self, doc_id):
+        with self._lock:
+            record = self._documents.get(doc_id)
+            return dict(record) if record else None
+
+    def named(self, names):
+        """Ids of the documents uploaded under any of ``names``."""
+        names = set(names)
+        with self._lock:
+            return [
+                doc_id
+                for doc_id, record in self._documents.items()
+                if names.intersection(record["names"])
+            ]
+
+    def uploaded_between(self, after=None, before=None):
+        """Ids of the documents first uploaded within ``after`` and ``before``."""
+        with self._lock:
+            return [
+                doc_id
+                for doc_id, record in self._documents.items()
+                if (after is None or record["created_at"] >= after)
+                and (before is None or record["created_at"] <= before)
+            ]
+
+    def is_indexed(self, doc_id):
+        record = self.get(doc_id)
+        return bool(record and record.get("indexed_at"))
+
+    def mark_indexed(self, doc_ids):
+        with self._lock:
+            records = [self._documents[d] for d in doc_ids if d in self._documents]
+            if not records:
+                return
+            indexed_at = time.time()
+            for record in records:
+                record["indexed_at"] = indexed_at
+            write_json_atomic(self.manifest_path, self._documents)
+
+    def path_for(self, doc_id):
+        record = self.get(doc_id)
+        if record is None:
+            return None
+        return os.path.join(self.root, record["filename"])
+
+    async def add_upload(self, file, extension=None, chunk_size=UPLOAD_CHUNK_SIZE):
+        name = os.path.basename(file.filename or "")
+        if not name:
+            raise ValueError("Uploaded file has no filename.")
+
+        tmp_path, doc_id, size = await stream_upload_to_temp(
+            file, self.root, chunk_size
+        )
+        if size == 0:
+            await aiofiles.os.remove(tmp_path)
+            return None
+
+        duplicate = False
+        with self._lock:
+            record = self._documents.get(doc_id)
+            if record is not None and os.path.exists(
+                os.path.join(self.root, record["filename"])
+            ):
+                duplicate = True
+                if name not in record["names"]:
+                    record["names"].append(name)
+                    write_json_atomic(self.manifest_path, self._documents)
+            else:
+                if extension is None:
+                    extension = os.path.splitext(name)[1].lower()
+                record = {
+                    "doc_id": doc_id,
+                    "filename": doc_id + extension,
+                    "names": [name],
+                    "size": size,
+                    "content_type": file.content_type,
+                    "created_at": time.time(),
+                }
+                os.replace(tmp_path, os.path.join(self.root, record["filename"]))
+                self._documents[doc_id] = record
+                write_json_atomic(self.manifest_path, self._documents)
+            record = dict(record, names=list(record["names"]))
+
+        if duplicate:
+            await aiofiles.os.remove(tmp_path)
+        return {**record, "duplicate": duplicate}
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_document_store(tenant=DEFAULT_TENANT):
+    """Return the DocumentStore of ``tenant``, one per process."""
+    tenant = check_tenant(tenant)
+    with _stores_lock:
+        if tenant not in _stores:
+            if tenant == DEFAULT_TENANT:
+                _stores[tenant] = DocumentStore()
+            else:
+                root = os.path.join(TENANTS_DIR, tenant)
+                _stores[tenant] = DocumentStore(
+                    os.path.join(root, "data"), os.path.join(root, "documents.json")
+                )
+        return _stores[tenant]
@@ -0,0 +1,167 @@
+import hashlib
+import os
+import threading
+import time
+
+import numpy as np
+
+from fileutils import safe_filename
+from sqlite_db import connect, select_in
+
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", "src/embedding_cache")
+EMBEDDING_CACHE_MAX_BYTES = int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", 512 * 1024**2))
+GROW_ROWS = 4096
+
+
+def embedding_key(text, kind="document"):
+    """Hash of the whitespace-normalised text; queries and documents differ."""
+    normalized = " ".join(text.split())
+    data = f"{kind}\0{normalized}".encode("utf-8", errors="surrogatepass")
+    return hashlib.sha256(data).hexdigest()
+
+
+class EmbeddingCache:
+    """Vectors of one embedding model, keyed by ``embedding_key``.
+
+    Vectors live in a memory-mapped float32 matrix that grows up to
+    ``max_bytes``; a SQLite index maps each key to its row and last use. Once
+    the matrix is full, the rows of the least recently used keys are reused.
+    """
+
+    def __init__(
+        self, model, directory=EMBEDDING_CACHE_DIR, max_bytes=EMBEDDING_CACHE_MAX_BYTES
+    ):
+        self.model = model
+        self.directory = os.path.join(directory, safe_filename(model))
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = None
+        self._vectors = None
+        self._dimensions = None
+        self._size = 0
+
+    def _connect(self):
+        if self._db is None:
+            db = connect(os.path.join(self.directory, "index.sqlite"))
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS entries"
+                " (key TEXT PRIMARY KEY, slot INTEGER UNIQUE, used REAL)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS entries_used ON entries (used)")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER)"
+            )
+            row = db.execute(
+                "SELECT value FROM meta WHERE name = 'dimensions'"
+            ).fetchone()
+            self._dimensions = row[0] if row else None
+            (self._size,) = db.execute("SELECT COUNT(*) FROM entries").fetchone()
+            self._db = db
+        return self._db
+
+    @property
+    def capacity(self):
+        return max(self.max_bytes // (self._dimensions * 4), 1)
+
+    def _map(self, rows):
+        path = os.path.join(self.directory, "vectors.f32")
+        with open(path, "a+b") as f:
+            if os.fstat(f.fileno()).st_size < rows * self._dimensions * 4:
+                f.truncate(rows * self._dimensions * 4)
+        if self._vectors is not None:
+            self._vectors.flush()
+        self._vectors = np.memmap(
+            path, dtype=np.float32, mode="r+", shape=(rows, self._dimensions)
+        )
+
+    def _ensure_rows(self, rows):
+        if self._vectors is None or len(self._vectors) < rows:
+            current = 0 if self._vectors is None else len(self._vectors)
+            self._map(min(max(rows, current + GROW_ROWS), self.capacity))
+
+    def get_many(self, keys):
+        """Return ``{key: vector}`` for the keys that are cached."""
+        with self._lock:
+            db = self._connect()
+            slots = dict(
+                select_in(
+                    db,
+                    "SELECT key, slot FROM entries WHERE key IN",
+                    dict.fromkeys(keys),
+                )
+            )
+            self.hits += sum(key in slots for key in keys)
+            self.misses += sum(key not in slots for key in keys)
+            if not slots:
+                return {}
+            self._ensure_rows(max(slots.values()) + 1)
+            now = time.time()
+            db.executemany(
+                "UPDATE entries SET used = ? WHERE key = ?",
+                [(now, key) for key in slots],
+            )
+            rows = self._vectors[list(slots.values())]
+        return dict(zip(slots, rows))
+
+    def put_many(self, keys, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if not len(vectors):
+            return
+        with self._lock:
+            db = self._connect()
+            if self._dimensions is None:
+                self._dimensions = vectors.shape[1]
+                db.execute(
+                    "INSERT OR REPLACE INTO meta VALUES ('dimensions', ?)",
+                    (self._dimensions,),
+                )
+            items = dict(zip(keys, vectors))
+            # The keys are listed before any is dropped from ``items``
+            for (key,) in select_in(db, "SELECT key FROM entries WHERE key IN", items):
+                del items[key]
+            items = list(items.items())[: self.capacity]
+            if not items:
+                return
+
+            fresh = min(len(items), self.capacity - self._size)
+            slots = list(range(self._size, self._size + fresh))
+            db.execute("BEGIN")
+            try:
+                if len(items) > fresh:
+                    evicted = db.execute(
+                        "SELECT key, slot FROM entries ORDER BY used LIMIT ?",
+                        (len(items) - fresh,),
+                    ).fetchall()
+                    db.executemany(
+                        "DELETE FROM entries WHERE key = ?",
+                        [(key,) for key, _ in evicted],
+                    )
+                    slots.extend(slot for _, slot in evicted)
+                self._ensure_rows(self._size + fresh)
+                for slot, (_, vector) in zip(slots, items):
+                    self._vectors[slot] = vector
+                # Rows are on disk before the index points at them
+                self._vectors.flush()
+                now = time.time()
+                db.executemany(
+                    "INSERT INTO entries VALUES (?, ?, ?)",
+                    [(key, slot, now) for slot, (key, _) in zip(slots, items)],
+                )
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            db.execute("COMMIT")
+            self._size += fresh
+
+    def stats(self):
+        with self._lock:
+            self._connect()
+            return {
+                "model": self.model,
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": self._size,
+                "dimensions": self._dimensions,
+            }
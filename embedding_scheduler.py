@@ -0,0 +1,176 @@
+import asyncio
+import os
+import random
+import threading
+import time
+
+from langchain_core.embeddings import Embeddings
+
+# Gemini's batchEmbedContents accepts at most 100 texts per request
+EMBED_REQUEST_SIZE = int(os.getenv("EMBED_REQUEST_SIZE", 100))
+EMBED_MAX_IN_FLIGHT = int(os.getenv("EMBED_MAX_IN_FLIGHT", 4))
+EMBED_REQUESTS_PER_MINUTE = float(os.getenv("EMBED_REQUESTS_PER_MINUTE", 1500))
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", 8))
+EMBED_BACKOFF_BASE = float(os.getenv("EMBED_BACKOFF_BASE", 1.0))
+EMBED_BACKOFF_MAX = float(os.getenv("EMBED_BACKOFF_MAX", 60.0))
+
+
+class RateLimitError(Exception):
+    """Raised by a provider when it answers 429 / quota exhausted."""
+
+
+def is_rate_limited(error):
+    # The Gemini client wraps google.api_core's ResourceExhausted (HTTP 429)
+    while error is not None:
+        if isinstance(error, RateLimitError) or getattr(error, "code", None) == 429:
+            return True
+        if type(error).__name__ in ("ResourceExhausted", "TooManyRequests"):
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+class TokenBucket:
+    """Request pacing shared by every batch of a scheduler.
+
+    Holds up to ``capacity`` tokens refilled at ``rate`` per second; each
+    request takes one. ``drain`` empties it after a 429 so the other batches
+    in flight fall back to the steady rate instead of bursting again.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = now - self._updated
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+        self._updated = now
+
+    def drain(self):
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self._tokens, 0)
+
+    async def acquire(self):
+        while True:
+            with self._lock:
+                self._refill(time.monotonic())
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            await asyncio.sleep(wait)
+
+
+class ScheduledEmbeddings(Embeddings):
+    """Embed through a provider with batching, concurrency and 429 handling.
+
+    Texts are grouped into ``request_size`` requests, up to ``max_in_flight``
+    of which run at once on the scheduler's own event loop, so throughput is
+    bounded by the token bucket (the provider quota) rather than by one
+    round trip at a time. Rate-limited requests are retried with full-jitter
+    exponential backoff. The loop and its limits are shared by every thread
+    that embeds through the same instance.
+    """
+
+    def __init__(
+        self,
+        embeddings,
+        request_size=EMBED_REQUEST_SIZE,
+        max_in_flight=EMBED_MAX_IN_FLIGHT,
+        requests_per_minute=EMBED_REQUESTS_PER_MINUTE,
+        max_retries=EMBED_MAX_RETRIES,
+        backoff_base=EMBED_BACKOFF_BASE,
+        backoff_max=EMBED_BACKOFF_MAX,
+    ):
+        self.embeddings = embeddings
+        self.model = getattr(embeddings, "model", type(embeddings).__name__)
+        self.request_size = request_size
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        # Bursts are capped at one second's worth of quota
+        rate = requests_per_minute / 60
+        self.bucket = TokenBucket(rate, max(1.0, rate))
+        self.requests = 0
+        self.rate_limited = 0
+        self._loop = None
+        self._semaphore = None
+        self._lock = threading.Lock()
+
+    @property
+    def dimensions(self):
+        return getattr(self.embeddings, "dimensions", None)
+
+    def _get_loop(self):
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(
+                    target=loop.run_forever, name="embedding-scheduler", daemon=True
+                ).start()
+                self._semaphore = asyncio.Semaphore(self.max_in_flight)
+                self._loop = loop
+            return self._loop
+
+    def close(self):
+        with self._lock:
+            if self._loop is not None:
+                self._loop.call_soon_threadsafe(self._loop.stop)
+                self._loop = None
+
+    async def _request(self, call, *args):
+        for attempt in range(self.max_retries + 1):
+            await self.bucket.acquire()
+            async with self._semaphore:
+                self.requests += 1
+                try:
+                    return await call(*args)
+                except Exception as e:
+                    if not is_rate_limited(e) or attempt == self.max_retries:
+                        raise
+            self.rate_limited += 1
+            self.bucket.drain()
+            limit = min(self.backoff_max, self.backoff_base * 2**attempt)
+            await asyncio.sleep(random.uniform(0, limit))
+
+    async def _embed_documents(self, texts):
+        requests = [
+            self._request(
+                self.embeddings.aembed_documents, texts[i : i + self.request_size]
+            )
+            for i in range(0, len(texts), self.request_size)
+        ]
+        batches = await asyncio.gather(*requests)
+        return [vector for batch in batches for vector in batch]
+
+    def _run(self, coroutine):
+        future = asyncio.run_coroutine_threadsafe(coroutine, self._get_loop())
+        return future.result()
+
+    def embed_documents(self, texts):
+        if not texts:
+            return []
+        return self._run(self._embed_documents(list(texts)))
+
+    def embed_query(self, text):
+        return self._run(self._request(self.embeddings.aembed_query, text))
+
+    async def aembed_documents(self, texts):
+        if not texts:
+            return []
+        future = asyncio.run_coroutine_threadsafe(
+            self._embed_documents(list(texts)), self._get_loop()
+        )
+        return await asyncio.wrap_future(future)
+
+    async def aembed_query(self, text):
+        future = asyncio.run_coroutine_threadsafe(
+            self._request(self.embeddings.aembed_query, text), self._get_loop()
+        )
+        return await asyncio.wrap_future(future)
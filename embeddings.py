@@ -0,0 +1,201 @@
+import asyncio
+import collections
+import hashlib
+import os
+import random
+import re
+import time
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from embedding_cache import EmbeddingCache, embedding_key
+from embedding_scheduler import RateLimitError, ScheduledEmbeddings
+from local_embeddings import LocalEmbeddings, OnnxEmbeddings
+
+EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "google")
+GOOGLE_EMBEDDING_MODEL = os.getenv("GOOGLE_EMBEDDING_MODEL", "models/embedding-001")
+EMBEDDING_DIMENSIONS = 768
+
+
+def embedding_dimensions(embeddings):
+    """Vector size of ``embeddings``; Gemini's embedding-001 does not report it."""
+    return getattr(embeddings, "dimensions", None) or EMBEDDING_DIMENSIONS
+
+
+class HashingEmbeddings(Embeddings):
+    """Deterministic local embeddings for benchmarks and offline runs.
+
+    Words and word bigrams are hashed into ``dimensions`` signed buckets and
+    the counts are L2-normalised, so texts sharing vocabulary land close
+    together without a model, a network call or any randomness.
+    """
+
+    _words = re.compile(r"\w+")
+
+    def __init__(self, dimensions=EMBEDDING_DIMENSIONS):
+        self.dimensions = dimensions
+
+    def _embed(self, text):
+        words = self._words.findall(text.lower())
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for feature in [*words, *map(" ".join, zip(words, words[1:]))]:
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            vector[value % self.dimensions] += 1.0 if value >> 63 else -1.0
+        norm = np.linalg.norm(vector)
+        if norm:
+            vector /= norm
+        return vector.tolist()
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+class CachedEmbeddings(Embeddings):
+    """Serve repeated texts from an EmbeddingCache; only misses reach ``embeddings``.
+
+    Documents and queries are cached under different keys, since providers
+    such as Gemini embed them with different task types.
+    """
+
+    def __init__(self, embeddings, model=None, cache=None):
+        self.embeddings = embeddings
+        self.model = model or getattr(embeddings, "model", type(embeddings).__name__)
+        self.cache = cache or EmbeddingCache(self.model)
+
+    @property
+    def dimensions(self):
+        return embedding_dimensions(self.embeddings)
+
+    def _embed(self, texts, kind, embed):
+        keys = [embedding_key(text, kind) for text in texts]
+        found = self.cache.get_many(keys)
+        missing = {key: text for key, text in zip(keys, texts) if key not in found}
+        if missing:
+            vectors = embed(list(missing.values()))
+            self.cache.put_many(list(missing), vectors)
+            found.update(zip(missing, vectors))
+        return [np.asarray(found[key], dtype=np.float32).tolist() for key in keys]
+
+    def embed_documents(self, texts):
+        return self._embed(texts, "document", self.embeddings.embed_documents)
+
+    def embed_query(self, text):
+        return self._embed(
+            [text], "query", lambda texts: [self.embeddings.embed_query(texts[0])]
+        )[0]
+
+
+class FakeEmbeddingProvider(HashingEmbeddings):
+    """HashingEmbeddings behind a simulated remote API, for offline tests.
+
+    Every request waits ``latency`` seconds (plus up to ``jitter``), and fails
+    with RateLimitError when more than ``requests_per_second`` arrive within a
+    second or at random with ``rate_limit_rate``; other failures are injected
+    with ``error_rate``. Request and concurrency counts are recorded.
+    """
+
+    def __init__(
+        self,
+        dimensions=EMBEDDING_DIMENSIONS,
+        latency=0.2,
+        jitter=0.05,
+        requests_per_second=None,
+        rate_limit_rate=0.0,
+        error_rate=0.0,
+        seed=0,
+    ):
+        super().__init__(dimensions)
+        self.latency = latency
+        self.jitter = jitter
+        self.requests_per_second = requests_per_second
+        self.rate_limit_rate = rate_limit_rate
+        self.error_rate = error_rate
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._random = random.Random(seed)
+        self._recent = collections.deque()
+
+    async def _request(self):
+        self.requests += 1
+        now = time.monotonic()
+        while self._recent and now - self._recent[0] > 1:
+            self._recent.popleft()
+        self._recent.append(now)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency + self._random.uniform(0, self.jitter))
+        finally:
+            self.in_flight -= 1
+        over_quota = (
+            self.requests_per_second is not None
+            and len(self._recent) > self.requests_per_second
+        )
+        if over_quota or self._random.random() < self.rate_limit_rate:
+            raise RateLimitError("429 Resource has been exhausted")
+        if self._random.random() < self.error_rate:
+            raise RuntimeError("injected provider error")
+
+    async def aembed_documents(self, texts):
+        await self._request()
+        return self.embed_documents(texts)
+
+    async def aembed_query(self, text):
+        await self._request()
+        return self.embed_query(text)
+
+
+_providers = {}
+
+
+def register_embedding_provider(name):
+    def decorator(factory):
+        _providers[name] = factory
+        return factory
+
+    return decorator
+
+
+def embedding_providers():
+    return sorted(_providers)
+
+
+def create_embeddings(name=EMBEDDING_PROVIDER):
+    """Build the embedding provider selected by EMBEDDING_PROVIDER."""
+    if name not in _providers:
+        raise ValueError(
+            f"Unknown embedding provider {name!r}, expected one of "
+            f"{embedding_providers()}."
+        )
+    return _providers[name]()
+
+
+@register_embedding_provider("google")
+def google_embeddings():
+    from langchain_google_genai import GoogleGenerativeAIEmbeddings
+
+    # Remote calls go out as concurrent, rate-limited batch requests
+    return ScheduledEmbeddings(
+        GoogleGenerativeAIEmbeddings(model=GOOGLE_EMBEDDING_MODEL)
+    )
+
+
+@register_embedding_provider("sentence-transformers")
+def sentence_transformer_embeddings():
+    return LocalEmbeddings()
+
+
+@register_embedding_provider("onnx")
+def onnx_embeddings():
+    return OnnxEmbeddings()
+
+
+@register_embedding_provider("hashing")
+def hashing_embeddings():
+    return HashingEmbeddings()
@@ -0,0 +1,134 @@
+import hashlib
+import math
+import multiprocessing
+import os
+import threading
+import warnings
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from langchain_core.documents import Document
+import pypdf
+from pypdf import PdfReader
+
+from ocr import OCR_MIN_CHARS, OCR_VERSION, ocr_pages
+
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", os.cpu_count() or 1))
+# 0 picks a range size that gives every worker a couple of ranges
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", 0))
+PDF_MAX_PAGES_PER_TASK = 32
+# Part of the text cache key: bump it whenever extraction output changes
+EXTRACTOR_VERSION = f"pypdf{pypdf.__version__}-1" + (
+    f"-{OCR_VERSION}-{OCR_MIN_CHARS}" if OCR_MIN_CHARS else ""
+)
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+def get_extract_executor(workers=PDF_EXTRACT_WORKERS):
+    # Pools are long-lived so worker start-up is paid once per process, not per file
+    with _executors_lock:
+        executor = _executors.get(workers)
+        if executor is None:
+            executor = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+            )
+            _executors[workers] = executor
+        return executor
+
+
+def shutdown_extract_executors():
+    with _executors_lock:
+        for executor in _executors.values():
+            executor.shutdown(wait=True)
+        _executors.clear()
+
+
+def count_pages(path):
+    return len(PdfReader(path).pages)
+
+
+def page_ranges(num_pages, workers, pages_per_task=PDF_PAGES_PER_TASK):
+    if pages_per_task <= 0:
+        pages_per_task = math.ceil(num_pages / (workers * 2))
+        pages_per_task = max(1, min(pages_per_task, PDF_MAX_PAGES_PER_TASK))
+    return [
+        (start, min(start + pages_per_task, num_pages))
+        for start in range(0, num_pages, pages_per_task)
+    ]
+
+
+def page_images_for_ocr(page):
+    images = []
+    try:
+        for image in page.images:
+            data = image.data
+            images.append((hashlib.sha256(data).hexdigest(), data))
+    except Exception as e:
+        warnings.warn(f"Could not read images of page {page.page_number}: {e}")
+    return images
+
+
+def extract_pages(reader, start, stop, ocr_min_chars=OCR_MIN_CHARS):
+    # Images are only pulled out of pages whose text layer is (nearly) empty
+    pages = []
+    for number in range(start, stop):
+        page = reader.pages[number]
+        text = page.extract_text()
+        images = []
+        if ocr_min_chars and len(text.strip()) < ocr_min_chars:
+            images = page_images_for_ocr(page)
+        pages.append((text, images))
+    return pages
+
+
+def extract_page_range(path, start, stop, ocr_min_chars=OCR_MIN_CHARS):
+    return extract_pages(PdfReader(path), start, stop, ocr_min_chars)
+
+
+def page_documents(path, start, pages):
+    for offset, text in enumerate(ocr_pages(pages)):
+        yield Document(
+            page_content=text, metadata={"source": path, "page": start + offset}
+        )
+
+
+def iter_pdf_pages(
+    path, workers=PDF_EXTRACT_WORKERS, pages_per_task=PDF_PAGES_PER_TASK
+):
+    reader = PdfReader(path)
+    ranges = page_ranges(len(reader.pages), workers, pages_per_task)
+    if workers <= 1 or len(ranges) <= 1:
+        # Without a pool, one reader serves every page
+        for start, stop in ranges:
+            yield from page_documents(path, start, extract_pages(reader, start, stop))
+        return
+
+    executor = get_extract_executor(workers)
+    remaining = iter(ranges)
+    in_flight = deque()
+
+    def submit_next():
+        page_range = next(remaining, None)
+        if page_range is not None:
+            start, stop = page_range
+            in_flight.append(
+                (start, executor.submit(extract_page_range, path, start, stop))
+            )
+
+    # Two ranges per worker in flight keeps every core busy while bounding how
+    # much extracted text waits in memory for the consumer
+    for _ in range(workers * 2):
+        submit_next()
+    while in_flight:
+        start, pending = in_flight.popleft()
+        pages = pending.result()
+        submit_next()
+        yield from page_documents(path, start, pages)
+
+
+def extract_pdf_pages(
+    path, workers=PDF_EXTRACT_WORKERS, pages_per_task=PDF_PAGES_PER_TASK
+):
+    return list(iter_pdf_pages(path, workers, pages_per_task))
@@ -0,0 +1,309 @@
+import os
+import threading
+
+import numpy as np
+
+from sqlite_db import connect, select_in
+from tenants import DEFAULT_TENANT
+from vector_index import index_partitions
+from vector_store import VectorStore
+
+FAISS_DIR = os.getenv("FAISS_DIR", "src/faiss")
+FAISS_HNSW_M = int(os.getenv("FAISS_HNSW_M", 32))
+FAISS_HNSW_EF_SEARCH = int(os.getenv("FAISS_HNSW_EF_SEARCH", 64))
+FAISS_IVF_NPROBE = int(os.getenv("FAISS_IVF_NPROBE", 16))
+# An IVF store searches a flat index until it has enough rows to train on
+FAISS_IVF_MIN_ROWS = int(os.getenv("FAISS_IVF_MIN_ROWS", 10_000))
+# Rows appended between writes of the index file; SQLite holds them meanwhile
+FAISS_CHECKPOINT_ROWS = int(os.getenv("FAISS_CHECKPOINT_ROWS", 10_000))
+COLUMNS = ("id", "text", "doc_id", "source", "page")
+
+
+class FaissStore(VectorStore):
+    """FAISS index (``flat``, ``ivf`` or ``hnsw``) with its rows in SQLite.
+
+    SQLite is the source of truth: every row keeps its vector there, and the
+    index file is rewritten every ``checkpoint_rows`` appended rows and after
+    deletions. Rows added after the last checkpoint are re-added on load.
+    HNSW cannot remove vectors, so its deleted rows stay as tombstones until
+    they outnumber the live ones and the index is rebuilt.
+    """
+
+    def __init__(
+        self,
+        tenant=DEFAULT_TENANT,
+        kind="flat",
+        directory=FAISS_DIR,
+        checkpoint_rows=FAISS_CHECKPOINT_ROWS,
+    ):
+        if kind not in ("flat", "ivf", "hnsw"):
+            raise ValueError(f"Unknown FAISS index {kind!r}.")
+        self.kind = kind
+        self.directory = os.path.join(directory, kind, tenant)
+        self.checkpoint_rows = checkpoint_rows
+        self._lock = threading.Lock()
+        self._db = None
+        self._index = None
+        self._dimensions = None
+        self._unsaved = 0
+        self._tombstones = 0
+
+    def _connect(self):
+        if self._db is None:
+            db = connect(os.path.join(self.directory, "rows.sqlite"))
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS rows (faiss_id INTEGER PRIMARY KEY,"
+                " id TEXT, text TEXT, doc_id TEXT, source TEXT, page INTEGER,"
+                " vector BLOB, deleted INTEGER NOT NULL DEFAULT 0)"
+            )
+            # Filters select documents, then pages within them
+            db.execute("DROP INDEX IF EXISTS rows_doc_id")
+            db.execute("DROP INDEX IF EXISTS rows_source_page")
+            db.execute(
+                "CREATE INDEX IF NOT EXISTS rows_doc_id_page ON rows (doc_id, page)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS rows_id ON rows (id)")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER)"
+            )
+            self._db = db
+            self._dimensions = self._meta("dimensions")
+            if self._dimensions is not None:
+                self._load()
+        return self._db
+
+    def _meta(self, name):
+        row = self._db.execute("SELECT value FROM meta WHERE name = ?", (name,))
+        row = row.fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, name, value):
+        self._db.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (name, value))
+
+    @property
+    def _path(self):
+        return os.path.join(self.directory, "index.faiss")
+
+    def _new_index(self, vectors):
+        import faiss
+
+        if self.kind == "ivf" and len(vectors) >= FAISS_IVF_MIN_ROWS:
+            quantizer = faiss.IndexFlatL2(self._dimensions)
+            index = faiss.IndexIVFFlat(
+                quantizer, self._dimensions, index_partitions(len(vectors))
+            )
+            index.train(vectors)
+            return index
+        if self.kind == "hnsw":
+            return faiss.IndexIDMap2(
+                faiss.IndexHNSWFlat(self._dimensions, FAISS_HNSW_M)
+            )
+        return faiss.IndexIDMap2(faiss.IndexFlatL2(self._dimensions))
+
+    def _live_vectors(self, after=0):
+        ids, vectors = [], []
+        for faiss_id, blob in self._db.execute(
+            "SELECT faiss_id, vector FROM rows WHERE deleted = 0 AND faiss_id > ?"
+            " ORDER BY faiss_id",
+            (after,),
+        ):
+            ids.append(faiss_id)
+            vectors.append(np.frombuffer(blob, dtype=np.float32))
+        vectors = np.array(vectors, dtype=np.float32).reshape(-1, self._dimensions)
+        return np.array(ids, dtype=np.int64), vectors
+
+    def _load(self):
+        import faiss
+
+        checkpoint = self._meta("checkpoint") or 0
+        (self._tombstones,) = self._db.execute(
+            "SELECT COUNT(*) FROM rows WHERE deleted = 1"
+        ).fetchone()
+        if os.path.exists(self._path):
+            self._index = faiss.read_index(self._path)
+        else:
+            checkpoint = 0
+            self._index = self._new_index(self._live_vectors()[1])
+        ids, vectors = self._live_vectors(checkpoint)
+        if len(ids):
+            self._index.add_with_ids(vectors, ids)
+            self._unsaved = len(ids)
+
+    def _rebuild(self):
+        ids, vectors = self._live_vectors()
+        self._index = self._new_index(vectors)
+        if len(ids):
+            self._index.add_with_ids(vectors, ids)
+        self._db.execute("DELETE FROM rows WHERE deleted = 1")
+        self._tombstones = 0
+        self._checkpoint()
+
+    def _checkpoint(self):
+        import faiss
+
+        (last,) = self._db.execute("SELECT MAX(faiss_id) FROM rows").fetchone()
+        faiss.write_index(self._index, self._path + ".tmp")
+        os.replace(self._path + ".tmp", self._path)
+        self._set_meta("checkpoint", last or 0)
+        self._unsaved = 0
+
+    def _is_ivf(self):
+        import faiss
+
+        return isinstance(self._index, faiss.IndexIVF)
+
+    def open(self, dimensions):
+        with self._lock:
+            self._connect()
+            if self._dimensions is None:
+                self._dimensions = dimensions
+                self._set_meta("dimensions", dimensions)
+                self._index = self._new_index(np.empty((0, dimensions), np.float32))
+
+    def add(self, rows):
+        if not rows:
+            return 0
+        vectors = np.array([row["vector"] for row in rows], dtype=np.float32)
+        self.open(vectors.shape[1])
+        with self._lock:
+            (last,) = self._db.execute("SELECT MAX(faiss_id) FROM rows").fetchone()
+            ids = np.arange((last or 0) + 1, (last or 0) + 1 + len(rows))
+            self._db.execute("BEGIN")
+            try:
+                self._db.executemany(
+                    "INSERT INTO rows VALUES (?, ?, ?, ?, ?, ?, ?, 0)",
+                    [
+                        (
+                            int(faiss_id),
+                            *(row[name] for name in COLUMNS),
+                            vector.tobytes(),
+                        )
+                        for faiss_id, row, vector in zip(ids, rows, vectors)
+                    ],
+                )
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+            self._index.add_with_ids(vectors, ids)
+            self._unsaved += len(rows)
+            if self.kind == "ivf" and not self._is_ivf():
+                if self._index.ntotal >= FAISS_IVF_MIN_ROWS:
+                    self._rebuild()
+            if self._unsaved >= self.checkpoint_rows:
+                self._checkpoint()
+        return len(rows)
+
+    def _doc_row_ids(self, doc_ids):
+        rows = select_in(
+            self._db,
+            "SELECT faiss_id FROM rows WHERE deleted = 0 AND doc_id IN",
+            doc_ids,
+        )
+        return np.array([faiss_id for (faiss_id,) in rows], dtype=np.int64)
+
+    def _count(self):
+        return self._db.execute(
+            "SELECT COUNT(*) FROM rows WHERE deleted = 0"
+        ).fetchone()[0]
+
+    def delete(self, doc_ids):
+        if not doc_ids:
+            return
+        with self._lock:
+            self._connect()
+            if self._index is None:
+                return
+            ids = self._doc_row_ids(doc_ids)
+            if not len(ids):
+                return
+            params = [(int(faiss_id),) for faiss_id in ids]
+            if self.kind == "hnsw":
+                self._db.executemany(
+                    "UPDATE rows SET deleted = 1 WHERE faiss_id = ?", params
+                )
+                self._tombstones += len(ids)
+                if self._tombstones > self._index.ntotal - self._tombstones:
+                    self._rebuild()
+                    return
+            else:
+                self._index.remove_ids(ids)
+                self._db.executemany("DELETE FROM rows WHERE faiss_id = ?", params)
+            self._checkpoint()
+
+    def has_document(self, doc_id):
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT 1 FROM rows WHERE doc_id = ? AND deleted = 0 LIMIT 1",
+                (doc_id,),
+            )
+            return row.fetchone() is not None
+
+    def count(self):
+        with self._lock:
+            self._connect()
+            return self._count()
+
+    def get(self, ids):
+        with self._lock:
+            self._connect()
+            rows = select_in(
+                self._db,
+                f"SELECT {', '.join(COLUMNS)} FROM rows WHERE deleted = 0 AND id IN",
+                ids,
+            )
+        return [dict(zip(COLUMNS, row)) for row in rows]
+
+    def _search_params(self, selector=None):
+        import faiss
+
+        if self._is_ivf():
+            return faiss.SearchParametersIVF(sel=selector, nprobe=FAISS_IVF_NPROBE)
+        if self.kind == "hnsw":
+            return faiss.SearchParametersHNSW(
+                sel=selector, efSearch=FAISS_HNSW_EF_SEARCH
+            )
+        return faiss.SearchParameters(sel=selector)
+
+    def search(self, vector, k, where=None):
+        import faiss
+
+        query = np.array([vector], dtype=np.float32)
+        with self._lock:
+            self._connect()
+            if self._index is None or not self._index.ntotal:
+                return []
+            fetch, selector = k, None
+            predicate = where and where.sql()
+            if predicate:
+                # Only the live rows SQLite finds for the filter are candidates
+                ids = np.array(
+                    self._db.execute(
+                        f"SELECT faiss_id FROM rows WHERE deleted = 0 AND {predicate}"
+                    ).fetchall(),
+                    dtype=np.int64,
+                ).reshape(-1)
+                if not len(ids):
+                    return []
+                selector = faiss.IDSelectorBatch(ids)
+            else:
+                # Tombstones still in an HNSW graph may take some of the slots
+                fetch += self._tombstones
+            distances, labels = self._index.search(
+                query, fetch, params=self._search_params(selector)
+            )
+            found = {
+                int(label): float(distance)
+                for label, distance in zip(labels[0], distances[0])
+                if label != -1
+            }
+            rows = select_in(
+                self._db,
+                f"SELECT faiss_id, {', '.join(COLUMNS)} FROM rows"
+                " WHERE deleted = 0 AND faiss_id IN",
+                found,
+            )
+        rows = sorted(rows, key=lambda row: found[row[0]])[:k]
+        return [
+            {**dict(zip(COLUMNS, row[1:])), "_distance": found[row[0]]} for row in rows
+        ]
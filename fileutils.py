@@ -0,0 +1,22 @@
+import json
+import os
+import re
+import tempfile
+
+
+def safe_filename(name):
+    """``name`` (such as a model name) with anything unsafe in paths replaced."""
+    return re.sub(r"[^\w.-]", "_", name)
+
+
+def write_json_atomic(path, data):
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".json")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
@@ -0,0 +1,47 @@
+def quote_sql(value):
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def in_filter(column, values):
+    return f"{column} IN (" + ", ".join(quote_sql(v) for v in values) + ")"
+
+
+class RowFilter:
+    """Metadata conditions on chunk rows, applied before the vector search.
+
+    ``doc_ids`` restricts rows to those documents and pages are bounded by
+    ``page_from`` and ``page_to`` (0-based, both inclusive). None means no
+    condition; an empty list matches no rows.
+    """
+
+    def __init__(self, doc_ids=None, page_from=None, page_to=None):
+        self.doc_ids = None if doc_ids is None else list(doc_ids)
+        self.page_from = page_from
+        self.page_to = page_to
+
+    def __repr__(self):
+        return (
+            f"RowFilter(doc_ids={self.doc_ids!r},"
+            f" page_from={self.page_from!r}, page_to={self.page_to!r})"
+        )
+
+    @property
+    def matches_nothing(self):
+        if self.doc_ids == []:
+            return True
+        return (
+            self.page_from is not None
+            and self.page_to is not None
+            and self.page_from > self.page_to
+        )
+
+    def sql(self):
+        """The conditions as an SQL predicate (LanceDB and SQLite), or None."""
+        clauses = []
+        if self.doc_ids is not None:
+            clauses.append(in_filter("doc_id", self.doc_ids))
+        if self.page_from is not None:
+            clauses.append(f"page >= {int(self.page_from)}")
+        if self.page_to is not None:
+            clauses.append(f"page <= {int(self.page_to)}")
+        return " AND ".join(clauses) or None
@@ -0,0 +1,76 @@
+import os
+
+from document_store import get_document_store
+from embedding_scheduler import EMBED_MAX_IN_FLIGHT, EMBED_REQUEST_SIZE
+from manifest import IngestManifest
+from tenants import DEFAULT_TENANT
+from test1 import (
+    embed_chunks,
+    iter_documents,
+    iter_text_chunks,
+    scan_data_directory,
+)
+from vector_store import ChunkWriter
+
+# Chunks handed to the embedding scheduler at once; it splits them into requests
+# that are kept in flight together, so this should cover several of them
+EMBED_BATCH_SIZE = int(
+    os.getenv("EMBED_BATCH_SIZE", EMBED_REQUEST_SIZE * EMBED_MAX_IN_FLIGHT)
+)
+INGEST_STAGES = ("parse", "chunk", "embed", "index")
+
+manifest = IngestManifest()
+
+
+def batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def ingest_documents(
+    job, doc_ids_by_path, tenant=DEFAULT_TENANT, batch_size=EMBED_BATCH_SIZE
+):
+    """Stream pages -> chunks -> embedding batches -> table appends.
+
+    Only one batch of chunks and vectors is alive at a time, so peak memory
+    follows ``batch_size`` rather than the size of the documents.
+    """
+    pages = job.track("parse", iter_documents(doc_ids_by_path))
+    chunks = job.track("chunk", iter_text_chunks(pages))
+    embedded = job.track(
+        "embed",
+        ((batch, embed_chunks(batch)) for batch in batched(chunks, batch_size)),
+        count=lambda item: len(item[0]),
+    )
+
+    writer = ChunkWriter(tenant)
+    rows = 0
+    try:
+        for batch, vectors in embedded:
+            with job.stage("index", items=len(batch)):
+                rows += writer.add(batch, vectors)
+    except BaseException:
+        manifest.release(doc_ids_by_path)
+        raise
+
+    # Files only count as ingested once their vectors are in the table
+    doc_ids = sorted(set(doc_ids_by_path.values()))
+    manifest.commit(doc_ids_by_path)
+    get_document_store(tenant).mark_indexed(doc_ids)
+    return {"documents": doc_ids, "chunks": rows}
+
+
+def ingest_upload(job):
+    path, doc_id = job.params["path"], job.params["doc_id"]
+    tenant = job.params.get("tenant", DEFAULT_TENANT)
+    return ingest_documents(job, {path: doc_id}, tenant)
+
+
+def sync_directory(job):
+    return ingest_documents(job, scan_data_directory(manifest))
@@ -0,0 +1,231 @@
+import asyncio
+import os
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", 2))
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", 100))
+# Finished jobs stay visible for polling this many seconds, at most this many
+JOB_RETENTION_SECONDS = float(os.getenv("JOB_RETENTION_SECONDS", 3600))
+JOB_HISTORY_SIZE = int(os.getenv("JOB_HISTORY_SIZE", 1000))
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class Job:
+    """Progress of one background job.
+
+    Pipelines stream items through their stages, so stage time is accounted
+    exclusively: while a stage pulls from an upstream stage, the clock runs
+    for the upstream one.
+    """
+
+    def __init__(self, kind, stage_names, **params):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.params = params
+        self.status = "queued"
+        self.error = None
+        self.result = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.stages = {
+            name: {"status": "pending", "items": 0, "duration": 0.0}
+            for name in stage_names
+        }
+        self._active = []
+        self._mark = None
+        self.finished = asyncio.Event()
+
+    def _switch(self, enter=None):
+        now = time.perf_counter()
+        if self._active:
+            self.stages[self._active[-1]]["duration"] += now - self._mark
+        self._mark = now
+        if enter is None:
+            self._active.pop()
+        else:
+            self._active.append(enter)
+            if self.stages[enter]["status"] == "pending":
+                self.stages[enter]["status"] = "running"
+
+    @contextmanager
+    def stage(self, name, items=0):
+        self._switch(enter=name)
+        try:
+            yield
+        finally:
+            self._switch()
+        self.stages[name]["items"] += items
+
+    def track(self, name, iterable, count=None):
+        iterator = iter(iterable)
+        while True:
+            self._switch(enter=name)
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.finish_stage(name)
+                return
+            finally:
+                self._switch()
+            self.stages[name]["items"] += count(item) if count else 1
+            yield item
+
+    def finish_stage(self, name):
+        self.stages[name]["status"] = "done"
+
+    def fail(self, error):
+        for stage in self.stages.values():
+            if stage["status"] == "running":
+                stage["status"] = "failed"
+        self.status = "failed"
+        self.error = str(error)
+        self.finished_at = time.time()
+        self.finished.set()
+
+    def to_dict(self):
+        done = sum(1 for stage in self.stages.values() if stage["status"] == "done")
+        finished_at = self.finished_at or time.time()
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "progress": f"{done}/{len(self.stages)}",
+            "stages": self.stages,
+            "error": self.error,
+            "result": self.result,
+            "created_at": self.created_at,
+            "queue_time": (self.started_at or finished_at) - self.created_at,
+            "run_time": (
+                finished_at - self.started_at if self.started_at is not None else None
+            ),
+            **self.params,
+        }
+
+
+class JobQueue:
+    """Bounded queue of background jobs run by a fixed pool of workers.
+
+    A pipeline is registered with its stage names and is called as
+    ``fn(job)`` in a worker thread, so the event loop stays free for requests.
+    Queued and running jobs are indexed by the registered ``key`` params;
+    finished ones are dropped after ``retention`` seconds or beyond ``history``.
+    """
+
+    def __init__(
+        self,
+        workers=INGEST_WORKERS,
+        max_pending=INGEST_QUEUE_SIZE,
+        retention=JOB_RETENTION_SECONDS,
+        history=JOB_HISTORY_SIZE,
+    ):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.retention = retention
+        self.history = history
+        self._pipelines = {}
+        self._jobs = {}
+        self._active = {}
+        self._finished = deque()
+        self._queue = None
+        self._tasks = []
+        self._executor = None
+
+    def register(self, kind, pipeline, stages, key=()):
+        self._pipelines[kind] = (pipeline, list(stages), tuple(key))
+
+    async def start(self):
+        self._queue = asyncio.Queue(maxsize=self.max_pending)
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="ingest"
+        )
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._executor.shutdown(wait=True)
+
+    def _key(self, kind, params):
+        _, _, key = self._pipelines[kind]
+        return (kind,) + tuple(params.get(name) for name in key)
+
+    def _add(self, job):
+        self._jobs[job.id] = job
+        self._active[self._key(job.kind, job.params)] = job
+
+    def _finish(self, job):
+        key = self._key(job.kind, job.params)
+        if self._active.get(key) is job:
+            del self._active[key]
+        self._finished.append(job)
+        expired = job.finished_at - self.retention
+        while self._finished and (
+            len(self._finished) > self.history
+            or self._finished[0].finished_at < expired
+        ):
+            self._jobs.pop(self._finished.popleft().id, None)
+
+    def submit(self, kind, **params):
+        _, stages, _ = self._pipelines[kind]
+        job = Job(kind, stages, **params)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise QueueFullError("Ingestion queue is full, try again later.")
+        self._add(job)
+        return job
+
+    async def submit_when_ready(self, kind, **params):
+        _, stages, _ = self._pipelines[kind]
+        job = Job(kind, stages, **params)
+        self._add(job)
+        await self._queue.put(job)
+        return job
+
+    async def wait(self, jobs, timeout=None):
+        await asyncio.wait_for(
+            asyncio.gather(*(job.finished.wait() for job in jobs)), timeout
+        )
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def find(self, kind, **params):
+        """The queued or running job of ``kind`` with these key params, if any."""
+        return self._active.get(self._key(kind, params))
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._run(job)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job):
+        loop = asyncio.get_running_loop()
+        pipeline, _, _ = self._pipelines[job.kind]
+        job.status = "running"
+        job.started_at = time.time()
+        try:
+            job.result = await loop.run_in_executor(self._executor, pipeline, job)
+        except Exception as e:
+            job.fail(e)
+            self._finish(job)
+            return
+        for name in job.stages:
+            job.finish_stage(name)
+        job.status = "done"
+        job.finished_at = time.time()
+        job.finished.set()
+        self._finish(job)
@@ -0,0 +1,329 @@
+import json
+import os
+import re
+import threading
+import uuid
+
+import numpy as np
+
+from fileutils import write_json_atomic
+from tenants import DEFAULT_TENANT, check_tenant
+
+KEYWORD_INDEX_DIR = os.getenv("KEYWORD_INDEX_DIR", "src/keyword_index")
+BM25_K1 = float(os.getenv("BM25_K1", 1.2))
+BM25_B = float(os.getenv("BM25_B", 0.75))
+# Every ingest batch becomes a segment; the smallest ones are merged together
+# once there are more than this many
+KEYWORD_MAX_SEGMENTS = int(os.getenv("KEYWORD_MAX_SEGMENTS", 8))
+KEYWORD_MERGE_FACTOR = 4
+# Longer runs of word characters are hashes or noise, not search terms
+MAX_TERM_LENGTH = 32
+# Arrays of a saved segment; older segments may hold others, which are ignored
+SEGMENT_ARRAYS = (
+    "terms",
+    "offsets",
+    "rows",
+    "freqs",
+    "lengths",
+    "ids",
+    "doc_ids",
+    "row_docs",
+    "pages",
+)
+
+_word = re.compile(r"\w+")
+
+
+def tokenize(text):
+    return [
+        word for word in _word.findall(text.lower()) if len(word) <= MAX_TERM_LENGTH
+    ]
+
+
+def encode_terms(words):
+    return np.array([word.encode("utf-8") for word in words], dtype="S")
+
+
+class Segment:
+    """Immutable BM25 postings of a batch of rows.
+
+    ``terms`` is a sorted array of UTF-8 terms. The postings of ``terms[i]``
+    are ``rows[offsets[i]:offsets[i + 1]]`` (row positions in the segment)
+    with their term frequencies in ``freqs``. ``lengths`` is the token count
+    of each row; ``row_docs`` indexes the row's document in ``doc_ids`` and
+    ``pages`` is its page.
+    Deleting documents only replaces the ``live`` mask.
+    """
+
+    def __init__(
+        self,
+        name,
+        terms,
+        offsets,
+        rows,
+        freqs,
+        lengths,
+        ids,
+        doc_ids,
+        row_docs,
+        pages,
+    ):
+        self.name = name
+        self.terms = terms
+        self.offsets = offsets
+        self.rows = rows
+        self.freqs = freqs
+        self.lengths = lengths
+        self.ids = ids
+        self.doc_ids = doc_ids
+        self.row_docs = row_docs
+        self.pages = pages
+        self.deleted = set()
+        self.set_live(np.ones(len(ids), dtype=bool))
+
+    def set_live(self, live):
+        self.live = live
+        self.live_rows = int(live.sum())
+        self.live_length = int(self.lengths[live].sum())
+
+    def delete(self, doc_ids):
+        doc_ids = set(doc_ids).intersection(np.char.decode(self.doc_ids, "utf-8"))
+        if not doc_ids - self.deleted:
+            return False
+        self.deleted |= doc_ids
+        deleted = np.isin(self.doc_ids, encode_terms(sorted(self.deleted)))
+        self.set_live(~deleted[self.row_docs])
+        return True
+
+    def matching(self, where):
+        """Mask of the rows that match the RowFilter ``where``."""
+        mask = np.ones(len(self.ids), dtype=bool)
+        if where.doc_ids is not None:
+            allowed = np.isin(self.doc_ids, encode_terms(where.doc_ids))
+            mask &= allowed[self.row_docs]
+        if where.page_from is not None:
+            mask &= self.pages >= where.page_from
+        if where.page_to is not None:
+            mask &= self.pages <= where.page_to
+        return mask
+
+    def postings(self, term):
+        index = np.searchsorted(self.terms, term)
+        if index == len(self.terms) or self.terms[index] != term:
+            return None
+        start, end = self.offsets[index], self.offsets[index + 1]
+        return self.rows[start:end], self.freqs[start:end]
+
+    @classmethod
+    def build(cls, rows):
+        tokens = [tokenize(row["text"]) for row in rows]
+        lengths = np.array([len(words) for words in tokens], dtype=np.int32)
+        words = encode_terms([word for words in tokens for word in words])
+        row_of = np.repeat(np.arange(len(rows), dtype=np.int64), lengths)
+        terms, term_of = np.unique(words, return_inverse=True)
+        # One posting per (term, row), sorted by term then row
+        keys, freqs = np.unique(term_of * len(rows) + row_of, return_counts=True)
+        doc_ids, row_docs = np.unique(
+            encode_terms(row["doc_id"] for row in rows), return_inverse=True
+        )
+        return cls(
+            uuid.uuid4().hex,
+            terms,
+            np.searchsorted(keys // len(rows), np.arange(len(terms) + 1)),
+            (keys % len(rows)).astype(np.int32),
+            np.minimum(freqs, np.iinfo(np.uint16).max).astype(np.uint16),
+            lengths,
+            encode_terms(row["id"] for row in rows),
+            doc_ids,
+            row_docs.astype(np.int32),
+            np.array([row["page"] for row in rows], dtype=np.int64),
+        )
+
+    @classmethod
+    def merge(cls, segments):
+        """One segment with the live rows of ``segments``."""
+        terms, rows, freqs, lengths, ids, doc_ids, pages = [], [], [], [], [], [], []
+        base = 0
+        for segment in segments:
+            # New positions of the live rows, -1 for deleted ones
+            position = np.cumsum(segment.live) - 1 + base
+            keep = segment.live[segment.rows]
+            terms.append(np.repeat(segment.terms, np.diff(segment.offsets))[keep])
+            rows.append(position[segment.rows[keep]])
+            freqs.append(segment.freqs[keep])
+            lengths.append(segment.lengths[segment.live])
+            ids.append(segment.ids[segment.live])
+            doc_ids.append(segment.doc_ids[segment.row_docs[segment.live]])
+            pages.append(segment.pages[segment.live])
+            base += segment.live_rows
+        all_terms, term_of = np.unique(np.concatenate(terms), return_inverse=True)
+        rows = np.concatenate(rows)
+        order = np.lexsort((rows, term_of))
+        unique_docs, row_docs = np.unique(np.concatenate(doc_ids), return_inverse=True)
+        return cls(
+            uuid.uuid4().hex,
+            all_terms,
+            np.searchsorted(term_of[order], np.arange(len(all_terms) + 1)),
+            rows[order].astype(np.int32),
+            np.concatenate(freqs)[order],
+            np.concatenate(lengths),
+            np.concatenate(ids),
+            unique_docs,
+            row_docs.astype(np.int32),
+            np.concatenate(pages),
+        )
+
+    def save(self, directory):
+        path = os.path.join(directory, f"{self.name}.npz")
+        with open(path + ".tmp", "wb") as f:
+            np.savez(f, **{key: getattr(self, key) for key in SEGMENT_ARRAYS})
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, directory, name, deleted):
+        with np.load(os.path.join(directory, f"{name}.npz")) as arrays:
+            segment = cls(name, **{key: arrays[key] for key in SEGMENT_ARRAYS})
+        segment.delete(deleted)
+        return segment
+
+
+class KeywordIndex:
+    """BM25 inverted index over the chunk rows of one tenant.
+
+    Rows are indexed in immutable segments, one per ``add``, saved as ``.npz``
+    arrays; ``segments.json`` lists the live segments and the documents
+    deleted from each. When there are more than ``max_segments``, the
+    smallest ones are merged, which also drops their deleted rows.
+    """
+
+    def __init__(self, directory, max_segments=KEYWORD_MAX_SEGMENTS):
+        self.directory = directory
+        self.max_segments = max_segments
+        self._lock = threading.Lock()
+        self._segments = None
+
+    @property
+    def _manifest_path(self):
+        return os.path.join(self.directory, "segments.json")
+
+    def _load(self):
+        if self._segments is None:
+            entries = []
+            if os.path.exists(self._manifest_path):
+                with open(self._manifest_path, encoding="utf-8") as f:
+                    entries = json.load(f)["segments"]
+            self._segments = [
+                Segment.load(self.directory, entry["name"], entry["deleted"])
+                for entry in entries
+            ]
+        return self._segments
+
+    def _commit(self, segments, removed=()):
+        write_json_atomic(
+            self._manifest_path,
+            {
+                "segments": [
+                    {"name": segment.name, "deleted": sorted(segment.deleted)}
+                    for segment in segments
+                ]
+            },
+        )
+        self._segments = segments
+        for segment in removed:
+            os.remove(os.path.join(self.directory, f"{segment.name}.npz"))
+
+    def add(self, rows):
+        if not rows:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        segment = Segment.build(rows)
+        segment.save(self.directory)
+        with self._lock:
+            segments = self._load() + [segment]
+            removed = []
+            if len(segments) > self.max_segments:
+                removed = sorted(segments, key=lambda s: s.live_rows)
+                removed = removed[:KEYWORD_MERGE_FACTOR]
+                merged = Segment.merge(removed)
+                merged.save(self.directory)
+                segments = [s for s in segments if s not in removed] + [merged]
+            self._commit(segments, removed)
+
+    def delete(self, doc_ids):
+        if not doc_ids:
+            return
+        with self._lock:
+            segments = self._load()
+            changed = [segment.delete(doc_ids) for segment in segments]
+            if any(changed):
+                removed = [s for s in segments if not s.live_rows]
+                self._commit([s for s in segments if s.live_rows], removed)
+
+    def count(self):
+        with self._lock:
+            return sum(segment.live_rows for segment in self._load())
+
+    def search(self, query, k, where=None):
+        """The ``k`` best rows for ``query`` as dicts with ``id`` and ``_score``."""
+        terms = np.unique(encode_terms(tokenize(query)))
+        with self._lock:
+            segments = list(self._load())
+        rows = sum(segment.live_rows for segment in segments)
+        if not rows or not len(terms):
+            return []
+        average_length = sum(segment.live_length for segment in segments) / rows
+
+        # Postings of live rows per segment and term, and document frequencies
+        matches = []
+        frequency = np.zeros(len(terms), dtype=np.int64)
+        for segment in segments:
+            found = []
+            for i, term in enumerate(terms):
+                postings = segment.postings(term)
+                if postings is None:
+                    continue
+                positions, freqs = postings
+                keep = segment.live[positions]
+                found.append((i, positions[keep], freqs[keep]))
+                frequency[i] += int(keep.sum())
+            matches.append((segment, found))
+        idf = np.log1p((rows - frequency + 0.5) / (frequency + 0.5))
+
+        best = []
+        for segment, found in matches:
+            if not found:
+                continue
+            scores = np.zeros(len(segment.ids), dtype=np.float32)
+            norm = BM25_K1 * (
+                1 - BM25_B + BM25_B * segment.lengths / max(average_length, 1)
+            )
+            for i, positions, freqs in found:
+                tf = freqs.astype(np.float32)
+                scores[positions] += (
+                    idf[i] * tf * (BM25_K1 + 1) / (tf + norm[positions])
+                )
+            if where is not None:
+                scores[~segment.matching(where)] = 0
+            candidates = np.flatnonzero(scores)
+            if len(candidates) > k:
+                top = np.argpartition(-scores[candidates], k - 1)[:k]
+                candidates = candidates[top]
+            best.extend(
+                (float(scores[position]), segment.ids[position].decode("utf-8"))
+                for position in candidates
+            )
+        best.sort(key=lambda hit: (-hit[0], hit[1]))
+        return [{"id": row_id, "_score": score} for score, row_id in best[:k]]
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_keyword_index(tenant=DEFAULT_TENANT):
+    """Return the KeywordIndex of ``tenant``, one per process."""
+    tenant = check_tenant(tenant)
+    with _indexes_lock:
+        if tenant not in _indexes:
+            _indexes[tenant] = KeywordIndex(os.path.join(KEYWORD_INDEX_DIR, tenant))
+        return _indexes[tenant]
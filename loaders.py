@@ -0,0 +1,229 @@
+import mimetypes
+import os
+import re
+import xml.etree.ElementTree as ET
+import zipfile
+from html.parser import HTMLParser
+
+import docx2txt.docx2txt as docx2txt
+import openpyxl
+from langchain_core.documents import Document
+
+from extraction import EXTRACTOR_VERSION, iter_pdf_pages
+
+# How much of a streamed file goes into one Document ("page") before it is yielded
+XLSX_ROWS_PER_PAGE = int(os.getenv("XLSX_ROWS_PER_PAGE", 200))
+DOCX_PARAGRAPHS_PER_PAGE = int(os.getenv("DOCX_PARAGRAPHS_PER_PAGE", 50))
+TEXT_CHARS_PER_PAGE = int(os.getenv("TEXT_CHARS_PER_PAGE", 8000))
+READ_BLOCK_SIZE = 64 * 1024
+
+
+class Loader:
+    def __init__(self, fn, extensions, mime_types, version, cache):
+        self.fn = fn
+        self.extensions = extensions
+        self.mime_types = mime_types
+        # Slow loaders (PDF) go through the extracted-text cache under this version
+        self.version = version
+        self.cache = cache
+
+    def __call__(self, path):
+        return self.fn(path)
+
+
+_by_extension = {}
+_by_mime_type = {}
+
+
+def register_loader(extensions, mime_types=(), version="1", cache=False):
+    def decorator(fn):
+        loader = Loader(fn, tuple(extensions), tuple(mime_types), version, cache)
+        for extension in extensions:
+            _by_extension[extension] = loader
+        for mime_type in mime_types:
+            _by_mime_type[mime_type] = loader
+        return fn
+
+    return decorator
+
+
+def get_loader(filename=None, content_type=None):
+    extension = os.path.splitext(filename or "")[1].lower()
+    loader = _by_extension.get(extension)
+    if loader is None and content_type:
+        loader = _by_mime_type.get(content_type.split(";")[0].strip().lower())
+    return loader
+
+
+def extension_for(filename=None, content_type=None):
+    loader = get_loader(filename, content_type)
+    extension = os.path.splitext(filename or "")[1].lower()
+    if loader is not None and extension not in loader.extensions:
+        extension = loader.extensions[0]
+    return extension or mimetypes.guess_extension(content_type or "") or ""
+
+
+def supported_patterns():
+    return [f"*{extension}" for extension in sorted(_by_extension)]
+
+
+def _page(text, path, number, **metadata):
+    return Document(
+        page_content=text, metadata={"source": path, "page": number, **metadata}
+    )
+
+
+@register_loader([".pdf"], ["application/pdf"], version=EXTRACTOR_VERSION, cache=True)
+def iter_pdf(path):
+    yield from iter_pdf_pages(path)
+
+
+@register_loader(
+    [".xlsx", ".xlsm"],
+    [
+        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        "application/vnd.ms-excel.sheet.macroenabled.12",
+    ],
+)
+def iter_xlsx(path, rows_per_page=XLSX_ROWS_PER_PAGE):
+    # read_only mode streams rows from the sheet XML instead of building the workbook
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    number = 0
+    try:
+        for sheet in workbook.worksheets:
+            lines = []
+            first_row = 1
+            for row_number, row in enumerate(sheet.iter_rows(values_only=True), 1):
+                cells = ["" if value is None else str(value) for value in row]
+                if any(cells):
+                    lines.append("\t".join(cells).rstrip("\t"))
+                if len(lines) == rows_per_page:
+                    yield _page(
+                        "\n".join(lines), path, number, sheet=sheet.title, row=first_row
+                    )
+                    number += 1
+                    lines = []
+                    first_row = row_number + 1
+            if lines:
+                yield _page(
+                    "\n".join(lines), path, number, sheet=sheet.title, row=first_row
+                )
+                number += 1
+    finally:
+        workbook.close()
+
+
+@register_loader(
+    [".docx"],
+    ["application/vnd.openxmlformats-officedocument.wordprocessingml.document"],
+)
+def iter_docx(path, paragraphs_per_page=DOCX_PARAGRAPHS_PER_PAGE):
+    with zipfile.ZipFile(path) as archive:
+        names = archive.namelist()
+        # Headers and footers are small, so docx2txt can parse them whole
+        headers = [n for n in names if re.match(r"word/header[0-9]*\.xml", n)]
+        footers = [n for n in names if re.match(r"word/footer[0-9]*\.xml", n)]
+        header_text = "".join(docx2txt.xml2text(archive.read(n)) for n in headers)
+        footer_text = "".join(docx2txt.xml2text(archive.read(n)) for n in footers)
+
+        number = 0
+        if header_text.strip():
+            yield _page(header_text.strip(), path, number, part="header")
+            number += 1
+
+        # The body is streamed with the same text rules as docx2txt.xml2text
+        text, paragraphs = [], 0
+        with archive.open("word/document.xml") as body:
+            for event, element in ET.iterparse(body, events=("start", "end")):
+                tag = element.tag
+                if event == "start":
+                    if tag == docx2txt.qn("w:p"):
+                        text.append("\n\n")
+                    elif tag == docx2txt.qn("w:tab"):
+                        text.append("\t")
+                    elif tag in (docx2txt.qn("w:br"), docx2txt.qn("w:cr")):
+                        text.append("\n")
+                elif tag == docx2txt.qn("w:t"):
+                    text.append(element.text or "")
+                elif tag == docx2txt.qn("w:p"):
+                    element.clear()
+                    paragraphs += 1
+                    if paragraphs == paragraphs_per_page:
+                        page_text = "".join(text).strip()
+                        if page_text:
+                            yield _page(page_text, path, number, part="body")
+                            number += 1
+                        text, paragraphs = [], 0
+        page_text = "".join(text).strip()
+        if page_text:
+            yield _page(page_text, path, number, part="body")
+            number += 1
+
+        if footer_text.strip():
+            yield _page(footer_text.strip(), path, number, part="footer")
+
+
+class _TextCollector(HTMLParser):
+    SKIP = {"script", "style", "noscript", "template", "head"}
+    BLOCKS = {"p", "div", "br", "li", "tr", "h1", "h2", "h3", "h4", "h5", "h6"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self.size = 0
+        self._skipping = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP:
+            self._skipping += 1
+        elif tag in self.BLOCKS:
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP and self._skipping:
+            self._skipping -= 1
+
+    def handle_data(self, data):
+        if not self._skipping:
+            self.parts.append(data)
+            self.size += len(data)
+
+    def drain(self):
+        text = re.sub(r"[ \t\r\f\v]+", " ", "".join(self.parts))
+        text = re.sub(r"\s*\n\s*", "\n", text).strip()
+        self.parts, self.size = [], 0
+        return text
+
+
+@register_loader([".html", ".htm"], ["text/html", "application/xhtml+xml"])
+def iter_html(path, chars_per_page=TEXT_CHARS_PER_PAGE):
+    # HTMLParser is fed block by block, so the document is never held whole
+    collector = _TextCollector()
+    number = 0
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for block in iter(lambda: f.read(READ_BLOCK_SIZE), ""):
+            collector.feed(block)
+            if collector.size >= chars_per_page:
+                text = collector.drain()
+                if text:
+                    yield _page(text, path, number)
+                    number += 1
+    collector.close()
+    text = collector.drain()
+    if text:
+        yield _page(text, path, number)
+
+
+@register_loader([".txt", ".md"], ["text/plain", "text/markdown"])
+def iter_text(path, chars_per_page=TEXT_CHARS_PER_PAGE):
+    lines, size, number = [], 0, 0
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for line in f:
+            lines.append(line)
+            size += len(line)
+            if size >= chars_per_page:
+                yield _page("".join(lines), path, number)
+                number += 1
+                lines, size = [], 0
+    if lines:
+        yield _page("".join(lines), path, number)
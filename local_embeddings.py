@@ -0,0 +1,235 @@
+import inspect
+import json
+import os
+import threading
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from fileutils import safe_filename
+
+LOCAL_EMBEDDING_MODEL = os.getenv(
+    "LOCAL_EMBEDDING_MODEL", "sentence-transformers/all-mpnet-base-v2"
+)
+LOCAL_EMBED_BATCH_SIZE = int(os.getenv("LOCAL_EMBED_BATCH_SIZE", 32))
+# Intra-op threads for torch; 0 keeps torch's default of one per core
+LOCAL_EMBED_THREADS = int(os.getenv("LOCAL_EMBED_THREADS", 0))
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", "src/onnx_models")
+# Dynamic int8 quantization of the exported weights; 0 keeps fp32
+ONNX_QUANTIZE = os.getenv("ONNX_QUANTIZE", "1") == "1"
+ONNX_OPSET = 14
+
+_models = {}
+_models_lock = threading.Lock()
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def load_local_model(model, threads=LOCAL_EMBED_THREADS):
+    """Load a sentence-transformers model once per process."""
+    with _models_lock:
+        if model not in _models:
+            import torch
+            from sentence_transformers import SentenceTransformer
+
+            if threads:
+                torch.set_num_threads(threads)
+            _models[model] = SentenceTransformer(model, device="cpu")
+        return _models[model]
+
+
+class LocalEmbeddings(Embeddings):
+    """sentence-transformers model running on the CPU of this process.
+
+    Vectors are L2-normalised, so LanceDB's L2 ranking equals cosine ranking
+    and no query needs a network round trip.
+    """
+
+    def __init__(
+        self,
+        model=LOCAL_EMBEDDING_MODEL,
+        batch_size=LOCAL_EMBED_BATCH_SIZE,
+        threads=LOCAL_EMBED_THREADS,
+    ):
+        self.model = model
+        self.batch_size = batch_size
+        self.threads = threads
+
+    @property
+    def client(self):
+        return load_local_model(self.model, self.threads)
+
+    @property
+    def dimensions(self):
+        return self.client.get_sentence_embedding_dimension()
+
+    def _encode(self, inputs):
+        vectors = self.client.encode(
+            inputs,
+            batch_size=self.batch_size,
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+            show_progress_bar=False,
+        )
+        return np.asarray(vectors, dtype=np.float32).tolist()
+
+    def embed_documents(self, texts):
+        return self._encode(list(texts)) if texts else []
+
+    def embed_query(self, text):
+        return self._encode([text])[0]
+
+
+def onnx_model_dir(model, directory=ONNX_MODEL_DIR):
+    return os.path.join(directory, safe_filename(model))
+
+
+def export_onnx(model, directory=ONNX_MODEL_DIR, quantize=True):
+    """Export a sentence-transformers model to ONNX, plus an int8 copy.
+
+    The transformer is exported with dynamic batch and sequence axes next to
+    its tokenizer and pooling settings; nothing is redone when the files
+    already exist. Returns the export directory.
+    """
+    path = onnx_model_dir(model, directory)
+    fp32 = os.path.join(path, "model.onnx")
+    int8 = os.path.join(path, "model.int8.onnx")
+    if not os.path.exists(fp32):
+        import torch
+
+        client = load_local_model(model)
+        transformer, pooling = client[0], client[1]
+        os.makedirs(path, exist_ok=True)
+        transformer.tokenizer.save_pretrained(path)
+        with open(os.path.join(path, "pooling.json"), "w") as f:
+            json.dump(
+                {
+                    "mode": pooling.get_pooling_mode_str(),
+                    "max_seq_length": client.max_seq_length,
+                },
+                f,
+            )
+        features = transformer.tokenizer(["export"], return_tensors="pt")
+        # Graph inputs follow the order of forward(), not of the tokenizer
+        names = [
+            name
+            for name in inspect.signature(transformer.auto_model.forward).parameters
+            if name in features
+        ]
+        axes = {0: "batch", 1: "sequence"}
+        with torch.no_grad():
+            torch.onnx.export(
+                transformer.auto_model,
+                tuple(features[name] for name in names),
+                fp32,
+                input_names=names,
+                output_names=["last_hidden_state"],
+                dynamic_axes={
+                    **{name: axes for name in names},
+                    "last_hidden_state": axes,
+                },
+                opset_version=ONNX_OPSET,
+            )
+    if quantize and not os.path.exists(int8):
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantize_dynamic(fp32, int8, weight_type=QuantType.QInt8)
+    return path
+
+
+def load_onnx_session(path, threads=LOCAL_EMBED_THREADS):
+    """Open an onnxruntime session once per process and file."""
+    with _sessions_lock:
+        if path not in _sessions:
+            import onnxruntime
+
+            options = onnxruntime.SessionOptions()
+            options.graph_optimization_level = (
+                onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+            )
+            if threads:
+                options.intra_op_num_threads = threads
+            _sessions[path] = onnxruntime.InferenceSession(
+                path, options, providers=["CPUExecutionProvider"]
+            )
+        return _sessions[path]
+
+
+class OnnxEmbeddings(LocalEmbeddings):
+    """LocalEmbeddings served by onnxruntime from an ONNX export of the model.
+
+    The model is exported (and quantized to int8 unless ``quantize`` is off)
+    on first use, then one session per file is shared by every request. The
+    pooling and normalisation of the sentence-transformers model are applied
+    to the session output, so vectors stay comparable with the fp32 model.
+    """
+
+    def __init__(
+        self,
+        model=LOCAL_EMBEDDING_MODEL,
+        batch_size=LOCAL_EMBED_BATCH_SIZE,
+        threads=LOCAL_EMBED_THREADS,
+        quantize=ONNX_QUANTIZE,
+        directory=ONNX_MODEL_DIR,
+    ):
+        super().__init__(model, batch_size, threads)
+        self.source = model
+        self.quantize = quantize
+        self.directory = directory
+        # Names the cache: int8 vectors are close to, not equal to, fp32 ones
+        self.model = f"{model}-onnx-{'int8' if quantize else 'fp32'}"
+        self._tokenizer = None
+        self._pooling = None
+
+    @property
+    def client(self):
+        path = export_onnx(self.source, self.directory, self.quantize)
+        if self._tokenizer is None:
+            from transformers import AutoTokenizer
+
+            self._tokenizer = AutoTokenizer.from_pretrained(path)
+            with open(os.path.join(path, "pooling.json")) as f:
+                self._pooling = json.load(f)
+        filename = "model.int8.onnx" if self.quantize else "model.onnx"
+        return load_onnx_session(os.path.join(path, filename), self.threads)
+
+    @property
+    def dimensions(self):
+        return self.client.get_outputs()[0].shape[-1]
+
+    def _pool(self, hidden, mask):
+        mode = self._pooling["mode"]
+        if mode == "cls":
+            return hidden[:, 0]
+        if mode == "max":
+            return np.where(mask[..., None] > 0, hidden, -1e9).max(axis=1)
+        if mode != "mean":
+            raise ValueError(f"Unsupported pooling mode {mode!r}.")
+        mask = mask[..., None].astype(np.float32)
+        return (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+
+    def _encode(self, inputs):
+        session = self.client
+        names = {node.name for node in session.get_inputs()}
+        # Longest texts first, as sentence-transformers does, to limit padding
+        order = np.argsort([-len(text) for text in inputs], kind="stable")
+        pooled = []
+        for start in range(0, len(order), self.batch_size):
+            features = self._tokenizer(
+                [inputs[i] for i in order[start : start + self.batch_size]],
+                padding=True,
+                truncation=True,
+                max_length=self._pooling["max_seq_length"],
+                return_tensors="np",
+            )
+            feed = {
+                name: value.astype(np.int64)
+                for name, value in features.items()
+                if name in names
+            }
+            (hidden,) = session.run(["last_hidden_state"], feed)
+            pooled.append(self._pool(hidden, features["attention_mask"]))
+        vectors = np.empty((len(inputs), pooled[0].shape[1]), dtype=np.float32)
+        vectors[order] = np.concatenate(pooled)
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        return vectors.tolist()
@@ -1,18 +1,36 @@
 from fastapi import FastAPI, UploadFile, File, HTTPException
 import uvicorn
 from io import BytesIO
-from typing import Optional
+from typing import List, Optional
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import Response
 from test1 import *
+from document_store import get_document_store
+from extraction import shutdown_extract_executors
+from ocr import shutdown_ocr_executor
+from ingestion import INGEST_STAGES, ingest_upload, manifest, sync_directory
+from jobs import JobQueue, QueueFullError
+from loaders import extension_for, get_loader, supported_patterns
+from embeddings import embedding_dimensions
+from filters import RowFilter
+from keyword_index import get_keyword_index
+from providers import init_providers
+from tenants import DEFAULT_TENANT, check_tenant
+from vector_store import (
+    get_documents_retriever,
+    get_vector_store,
+    index_manager,
+)
 from fastapi.responses import JSONResponse
 from PyPDF2 import PdfReader
 from pydantic import BaseModel
-import io
+import asyncio
+import collections
+import os
+from datetime import datetime
 import time
 import shutil
 
-
 app = FastAPI()
 
 app.add_middleware(
@@ -26,9 +44,48 @@ app.add_middleware(
 
 class UserQuestion(BaseModel):
     question: str
-
-
-memory = ConversationBufferMemory()
+    # Questions are answered from the tenant's documents only, optionally
+    # narrowed to some of them
+    tenant: Optional[str] = None
+    document_ids: Optional[List[str]] = None
+    # Metadata filters, applied before the vector search; sources are file
+    # names as uploaded (or as in the data directory) and pages are 0-based,
+    # as in PyPDFLoader metadata, and inclusive
+    sources: Optional[List[str]] = None
+    page_from: Optional[int] = None
+    page_to: Optional[int] = None
+    uploaded_after: Optional[datetime] = None
+    uploaded_before: Optional[datetime] = None
+
+
+# Conversation history is kept per tenant, like the documents
+memories = collections.defaultdict(ConversationBufferMemory)
+job_queue = JobQueue()
+job_queue.register("ingest", ingest_upload, INGEST_STAGES, key=("doc_id", "tenant"))
+job_queue.register("sync", sync_directory, INGEST_STAGES)
+
+
+def open_shared_resources():
+    # Clients and the indexes are opened once and shared by every request
+    init_providers()
+    get_vector_store().open(embedding_dimensions(get_embeddings()))
+    get_keyword_index().count()
+
+
+@app.on_event("startup")
+async def start_job_queue():
+    await asyncio.get_running_loop().run_in_executor(None, open_shared_resources)
+    await job_queue.start()
+    # Pick up files added to, changed in or removed from "data" while we were down
+    job_queue.submit("sync")
+
+
+@app.on_event("shutdown")
+async def stop_job_queue():
+    await job_queue.stop()
+    shutdown_extract_executors()
+    shutdown_ocr_executor()
+    index_manager.shutdown()
 
 
 @app.get("/")
@@ -36,52 +93,218 @@ async def root():
     return {"message": "Hello, world!"}
 
 
-@app.post("/upload/")
-async def upload_pdf(file: UploadFile = File(...)):
-    start_time = time.time()  # Start time
-    contents = await file.read()
-    pdf_bytes = io.BytesIO(contents)
-    if not contents:
+def resolve_tenant(tenant):
+    try:
+        return check_tenant(tenant)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def question_filter(user_question, tenant):
+    # File names and upload times are kept per document, so they narrow the
+    # document ids
+    document_store = get_document_store(tenant)
+    allowed = []
+    if user_question.sources is not None:
+        named = document_store.named(user_question.sources)
+        if tenant == DEFAULT_TENANT:
+            named += manifest.named(user_question.sources)
+        allowed.append(set(named))
+    after, before = user_question.uploaded_after, user_question.uploaded_before
+    if after or before:
+        uploaded = document_store.uploaded_between(
+            after.timestamp() if after else None,
+            before.timestamp() if before else None,
+        )
+        allowed.append(set(uploaded))
+    doc_ids = user_question.document_ids
+    for ids in allowed:
+        if doc_ids is None:
+            doc_ids = sorted(ids)
+        else:
+            doc_ids = [doc_id for doc_id in doc_ids if doc_id in ids]
+    return RowFilter(
+        doc_ids, page_from=user_question.page_from, page_to=user_question.page_to
+    )
+
+
+async def submit_ingest(document_store, doc_id, tenant, block_when_full):
+    # Parsing, chunking and embedding run in the background job queue
+    path = document_store.path_for(doc_id)
+    # The default tenant's uploads land in the synced data directory: they are
+    # pending in the ingest manifest before being queued, so a sync leaves them
+    # to this job, and content a sync is already ingesting is left to it
+    if tenant == DEFAULT_TENANT and not manifest.track(path, doc_id):
+        return job_queue.find("sync")
+    params = {"doc_id": doc_id, "path": path, "tenant": tenant}
+    try:
+        if block_when_full:
+            return await job_queue.submit_when_ready("ingest", **params)
+        return job_queue.submit("ingest", **params)
+    except BaseException as e:
+        manifest.release([path])
+        if isinstance(e, QueueFullError):
+            raise HTTPException(status_code=503, detail=str(e))
+        raise
+
+
+async def store_upload(file, tenant, block_when_full=False):
+    start_time = time.time()
+    document_store = get_document_store(tenant)
+    if get_loader(file.filename, file.content_type) is None:
+        await file.close()
+        raise HTTPException(
+            status_code=415,
+            detail=f"Unsupported file type, expected one of {supported_patterns()}.",
+        )
+    try:
+        # Stream the upload into the content-addressed store; known content is a no-op
+        document = await document_store.add_upload(
+            file, extension_for(file.filename, file.content_type)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        await file.close()
+
+    if document is None:
         raise HTTPException(
             status_code=400, detail="Failed to load documents from the file."
         )
+    upload_time = time.time() - start_time
+
+    doc_id = document["doc_id"]
+    if tenant == DEFAULT_TENANT and manifest.is_indexed(doc_id):
+        # Content the data directory sync already indexed under another name
+        document_store.mark_indexed([doc_id])
+    job = job_queue.find("ingest", doc_id=doc_id, tenant=tenant)
+    # A document whose job failed midway has rows but no indexed_at, so it is
+    # ingested again
+    if job is None and not document_store.is_indexed(doc_id):
+        job = await submit_ingest(document_store, doc_id, tenant, block_when_full)
 
-    # Ensure the "data" directory exists or create it if not
-    data_dir = "data"
-    if not os.path.exists(data_dir):
-        os.makedirs(data_dir)
+    return document, job, upload_time
 
-    # Save the uploaded file to "data" directory
-    file_path = os.path.join(data_dir, file.filename)
-    with open(file_path, "wb") as f:
-        f.write(contents)
+
+@app.post("/upload/")
+async def upload_pdf(file: UploadFile = File(...), tenant: Optional[str] = None):
+    start_time = time.time()  # Start time
+    document, job, _ = await store_upload(file, resolve_tenant(tenant))
 
     response_time = time.time() - start_time
     return {
-        "message": "PDF uploaded successfully",
-        "pdf_bytes": pdf_bytes,
+        "message": (
+            "File already uploaded"
+            if document["duplicate"]
+            else "File uploaded successfully"
+        ),
+        "document_id": document["doc_id"],
+        "job_id": job.id if job else None,
+        "duplicate": document["duplicate"],
+        "filename": os.path.basename(file.filename),
+        "size": document["size"],
         "response_time": response_time,
     }
 
 
+@app.post("/upload/batch")
+async def upload_batch(
+    files: List[UploadFile] = File(...),
+    wait: bool = False,
+    tenant: Optional[str] = None,
+):
+    start_time = time.time()
+    tenant = resolve_tenant(tenant)
+
+    async def store(file):
+        try:
+            # Jobs wait for room in the queue instead of failing the rest of the batch
+            document, job, upload_time = await store_upload(
+                file, tenant, block_when_full=True
+            )
+        except HTTPException as e:
+            return {
+                "filename": file.filename,
+                "status_code": e.status_code,
+                "error": e.detail,
+            }, None
+        return {
+            "filename": file.filename,
+            "document_id": document["doc_id"],
+            "duplicate": document["duplicate"],
+            "size": document["size"],
+            "upload_time": upload_time,
+            "job_id": job.id if job else None,
+        }, job
+
+    stored = await asyncio.gather(*(store(file) for file in files))
+
+    if wait:
+        await job_queue.wait([job for _, job in stored if job is not None])
+    results = []
+    for result, job in stored:
+        if wait and job is not None:
+            details = job.to_dict()
+            result.update(
+                status=details["status"],
+                error=details["error"],
+                chunks=(details["result"] or {}).get("chunks"),
+                queue_time=details["queue_time"],
+                run_time=details["run_time"],
+                stages={
+                    name: stage["duration"] for name, stage in details["stages"].items()
+                },
+            )
+        results.append(result)
+
+    response_time = time.time() - start_time
+    return {
+        "files": results,
+        "total_size": sum(result.get("size", 0) for result in results),
+        "response_time": response_time,
+    }
+
+
+@app.post("/sync/")
+async def sync_data_directory():
+    try:
+        job = job_queue.submit("sync")
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return {"job_id": job.id}
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job.to_dict()
+
+
+@app.get("/embeddings/cache")
+async def get_embedding_cache_stats():
+    return get_embeddings().cache.stats()
+
+
 @app.post("/chatpdf/")
 async def process_user_question(user_question: UserQuestion):
     start_time = time.time()
+    tenant = resolve_tenant(user_question.tenant)
+    memory = memories[tenant]
     try:
-        # Load documents from the file
-        docs = load_documents_from_file(upload_pdf())
+        # Documents are ingested by background jobs; only retrieval happens here
+        retriever = get_documents_retriever(
+            get_embeddings(),
+            where=question_filter(user_question, tenant),
+            tenant=tenant,
+        )
 
-        if not docs:
+        if retriever is None:
             raise HTTPException(
-                status_code=400, detail="No documents loaded from file."
+                status_code=400, detail="No documents have been ingested yet."
             )
 
-        # Specify chunk size and overlap
-        chunk = get_text_chunks(docs)
-
-        # Initialize Vector Database
-        retriever = initialize_vector_database(chunk)
-
         # Generate RAG chain
         rag_chain = generate_rag_chain(retriever, user_question.question, memory)
 
@@ -111,6 +334,8 @@ async def process_user_question(user_question: UserQuestion):
 @app.post("/chaturl/")
 async def chaturl(user_question: UserQuestion, url: str):
     start_time = time.time()
+    tenant = resolve_tenant(user_question.tenant)
+    memory = memories[tenant]
     try:
         if not user_question or not url:
             raise HTTPException(
@@ -128,7 +353,7 @@ async def chaturl(user_question: UserQuestion, url: str):
         text_chunks = get_text_chunks(docs)
 
         # Initialize Vector Database
-        retriever = initialize_vector_database(text_chunks)
+        retriever = initialize_vector_database(text_chunks, tenant)
 
         # Generate RAG chain
         rag_chain = generate_rag_chain(retriever, user_question.question, memory)
@@ -0,0 +1,152 @@
+import fnmatch
+import hashlib
+import glob
+import json
+import os
+import threading
+
+from fileutils import write_json_atomic
+
+INGEST_MANIFEST = os.getenv("INGEST_MANIFEST", "src/ingest_manifest.json")
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_sha256(path, chunk_size=HASH_CHUNK_SIZE):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class IngestManifest:
+    """Size, mtime and content hash of every file whose chunks are indexed.
+
+    ``scan`` only hashes files whose size or mtime moved, and files it reports
+    as changed stay pending until ``commit`` is called after indexing, or
+    ``release`` after a failure, so a failed ingestion is retried on the next
+    scan. Content that is already
+    pending, from ``track`` or an earlier scan, is not reported again.
+    """
+
+    def __init__(self, path=INGEST_MANIFEST):
+        self.path = path
+        self._lock = threading.Lock()
+        self._files = self._load()
+        self._pending = {}
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def _save(self):
+        write_json_atomic(self.path, self._files)
+
+    def entry_for(self, path, sha256=None):
+        stat = os.stat(path)
+        known = self._files.get(path)
+        if sha256 is None:
+            if (
+                known
+                and known["size"] == stat.st_size
+                and known["mtime_ns"] == stat.st_mtime_ns
+            ):
+                sha256 = known["sha256"]
+            else:
+                sha256 = file_sha256(path)
+        return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": sha256}
+
+    def scan(self, data_dir, patterns=("*.pdf",)):
+        """Return ``(changed, removed_doc_ids)`` for files under ``data_dir``.
+
+        ``changed`` maps each added or modified path to its new entry. Entries
+        of deleted files are dropped, and the content hashes that no remaining
+        file shares are returned so their vectors can be removed.
+        """
+        paths = sorted(
+            {
+                path
+                for pattern in patterns
+                for path in glob.glob(os.path.join(data_dir, pattern))
+            }
+        )
+        entries = {path: self.entry_for(path) for path in paths}
+
+        with self._lock:
+            removed = [
+                path
+                for path in self._files
+                if os.path.dirname(path) == os.path.normpath(data_dir)
+                and any(
+                    fnmatch.fnmatch(os.path.basename(path), pattern)
+                    for pattern in patterns
+                )
+                and path not in entries
+            ]
+            removed_hashes = {self._files.pop(path)["sha256"] for path in removed}
+
+            indexed_hashes = {entry["sha256"] for entry in self._files.values()}
+            pending_hashes = {entry["sha256"] for entry in self._pending.values()}
+            changed = {}
+            for path, entry in entries.items():
+                previous = self._files.get(path)
+                if previous == entry:
+                    continue
+                if previous is not None and previous["sha256"] != entry["sha256"]:
+                    # Modified in place: the old content's vectors go away
+                    removed_hashes.add(self._files.pop(path)["sha256"])
+                if entry["sha256"] in indexed_hashes:
+                    # Touched, or a copy of content that is already indexed
+                    self._files[path] = entry
+                    continue
+                if entry["sha256"] in pending_hashes:
+                    # Already being ingested; recorded by a scan after its commit
+                    continue
+                changed[path] = entry
+                self._pending[path] = entry
+                pending_hashes.add(entry["sha256"])
+
+            self._save()
+            still_indexed = {entry["sha256"] for entry in self._files.values()}
+            pending_hashes = {entry["sha256"] for entry in self._pending.values()}
+            removed_doc_ids = removed_hashes - still_indexed - pending_hashes
+        return changed, sorted(removed_doc_ids)
+
+    def track(self, path, sha256=None):
+        """Make ``path`` pending, unless its content already is (False then)."""
+        entry = self.entry_for(path, sha256)
+        with self._lock:
+            if any(e["sha256"] == entry["sha256"] for e in self._pending.values()):
+                return False
+            self._pending[path] = entry
+        return True
+
+    def release(self, paths):
+        # Pending files that were not ingested after all; the next scan retries them
+        with self._lock:
+            for path in paths:
+                self._pending.pop(path, None)
+
+    def commit(self, paths):
+        with self._lock:
+            for path in paths:
+                entry = self._pending.pop(path, None)
+                if entry is not None:
+                    self._files[path] = entry
+            self._save()
+
+    def is_indexed(self, sha256):
+        with self._lock:
+            return any(entry["sha256"] == sha256 for entry in self._files.values())
+
+    def named(self, names):
+        """Content hashes of the indexed files called any of ``names``."""
+        names = set(names)
+        with self._lock:
+            return [
+                entry["sha256"]
+                for path, entry in self._files.items()
+                if os.path.basename(path) in names
+            ]
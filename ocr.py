@@ -0,0 +1,103 @@
+import multiprocessing
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+# Pages whose text layer has fewer characters than this are sent to OCR; 0 disables it
+OCR_MIN_CHARS = int(os.getenv("OCR_MIN_CHARS", 20))
+# Each OCR worker process holds one ONNX session, so this caps concurrent sessions
+OCR_MAX_SESSIONS = int(os.getenv("OCR_MAX_SESSIONS", 2))
+OCR_CACHE_DIR = os.getenv("OCR_CACHE_DIR", "src/ocr_cache")
+OCR_VERSION = "rapidocr1"
+
+_engine = None
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_engine():
+    global _engine
+    if _engine is None:
+        from rapidocr_onnxruntime import RapidOCR
+
+        _engine = RapidOCR()
+    return _engine
+
+
+def recognize_image(data):
+    result, _ = _get_engine()(data)
+    if not result:
+        return ""
+    return "\n".join(line[1] for line in result)
+
+
+def get_ocr_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=OCR_MAX_SESSIONS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _executor
+
+
+def shutdown_ocr_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
+
+
+class OcrCache:
+    """Recognized text keyed by the SHA-256 of the page image bytes."""
+
+    def __init__(self, directory=OCR_CACHE_DIR):
+        self.directory = os.path.join(directory, OCR_VERSION)
+
+    def _path(self, digest):
+        return os.path.join(self.directory, digest[:2], digest + ".txt")
+
+    def get(self, digest):
+        try:
+            with open(self._path(digest), encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, digest, text):
+        path = self._path(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".part")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+
+
+ocr_cache = OcrCache()
+
+
+def ocr_pages(pages):
+    """Fill in the text of sparse pages from their images.
+
+    ``pages`` is a list of ``(text, images)`` where ``images`` holds
+    ``(sha256, bytes)`` pairs for pages that need OCR and is empty otherwise.
+    All cache misses of the batch are recognized concurrently.
+    """
+    futures = {}
+    for _, images in pages:
+        for digest, data in images:
+            if digest not in futures and ocr_cache.get(digest) is None:
+                futures[digest] = get_ocr_executor().submit(recognize_image, data)
+    for digest, future in futures.items():
+        ocr_cache.put(digest, future.result())
+
+    texts = []
+    for text, images in pages:
+        if images:
+            recognized = [ocr_cache.get(digest) for digest, _ in images]
+            text = "\n".join(part for part in [text.strip(), *recognized] if part)
+        texts.append(text)
+    return texts
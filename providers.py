@@ -0,0 +1,30 @@
+import functools
+import os
+
+from embeddings import CachedEmbeddings, create_embeddings, embedding_dimensions
+
+CHAT_MODEL = os.getenv("CHAT_MODEL", "gemini-pro")
+
+
+@functools.lru_cache(maxsize=None)
+def get_embeddings():
+    # EMBEDDING_PROVIDER picks the backend (Gemini or a local CPU model); texts
+    # embedded before are served from the on-disk embedding cache
+    return CachedEmbeddings(create_embeddings())
+
+
+@functools.lru_cache(maxsize=None)
+def get_chat_model():
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    return ChatGoogleGenerativeAI(model=CHAT_MODEL)
+
+
+def init_providers():
+    """Build the embedding and chat clients once, before the first request.
+
+    Every request then reuses the same clients and their open connections;
+    a local embedding model is loaded here rather than on the first question.
+    """
+    embedding_dimensions(get_embeddings())
+    get_chat_model()
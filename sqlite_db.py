@@ -0,0 +1,25 @@
+import os
+import sqlite3
+
+# Older SQLite builds accept at most 999 parameters per statement
+SQLITE_MAX_PARAMS = 500
+
+
+def connect(path):
+    """Autocommit connection in WAL mode, shared between threads under a lock."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+    db.execute("PRAGMA journal_mode=WAL")
+    # Commits survive a crash of the process, only an OS crash can lose the last ones
+    db.execute("PRAGMA synchronous=NORMAL")
+    return db
+
+
+def select_in(db, query, values):
+    """Rows of ``query``, which ends with "IN", for ``values`` in batches."""
+    values = list(values)
+    rows = []
+    for start in range(0, len(values), SQLITE_MAX_PARAMS):
+        batch = values[start : start + SQLITE_MAX_PARAMS]
+        rows.extend(db.execute(f"{query} ({', '.join('?' * len(batch))})", batch))
+    return rows
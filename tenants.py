@@ -0,0 +1,16 @@
+import os
+import re
+
+DEFAULT_TENANT = os.getenv("DEFAULT_TENANT", "default")
+
+_tenant_name = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+
+def check_tenant(tenant):
+    """Return ``tenant`` (or the default one) if it is safe in paths and table names."""
+    tenant = tenant or DEFAULT_TENANT
+    if not _tenant_name.fullmatch(tenant):
+        raise ValueError(
+            f"Invalid tenant {tenant!r}, expected up to 64 letters, digits, '_' or '-'."
+        )
+    return tenant
@@ -1,86 +1,112 @@
-import os
 from dotenv import load_dotenv
-import lancedb
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import LanceDB
-from langchain_community.document_loaders import (
-    WebBaseLoader,
-    PyPDFLoader,
-    DirectoryLoader,
-)
+from langchain_community.document_loaders import WebBaseLoader
 from langchain.memory import ConversationBufferMemory
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.runnables import RunnablePassthrough
-import google.generativeai as genai
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from langchain_google_genai import ChatGoogleGenerativeAI
+from chunk_cache import ChunkCache, iter_cached_chunks, text_sha256
+from chunking import TiktokenTextSplitter
+from filters import RowFilter
+from loaders import get_loader, supported_patterns
+from manifest import IngestManifest
+from providers import get_chat_model, get_embeddings
+from tenants import DEFAULT_TENANT
+from text_cache import TextCache, iter_cached_pages
+from vector_store import (
+    ChunkWriter,
+    delete_documents,
+    get_documents_retriever,
+    has_document,
+)
 
 load_dotenv()
 
+text_cache = TextCache()
+chunk_cache = ChunkCache()
+
 
 def load_documents():
     source, data = prompt_link_or_data()
     documents = []
     try:
         if source == "link":
-            loader = WebBaseLoader(data)
-            documents = loader.load()
+            documents = load_documents_from_url(data)
         else:
-            documents_loader = DirectoryLoader(
-                "data", glob="./*.pdf", loader_cls=PyPDFLoader
-            )
-            documents = documents_loader.load()
+            documents = load_documents_from_file(None)
     except Exception as e:
         print(f"Error loading documents: {e}")
     return documents
 
 
-def load_documents_from_file(documents_loader):
-    documents_loader = DirectoryLoader("data", glob="./*.pdf", loader_cls=PyPDFLoader)
-    documents_docs = documents_loader.load()
-    return documents_docs
+def scan_data_directory(manifest):
+    changed, removed_doc_ids = manifest.scan("data", supported_patterns())
+    delete_documents(removed_doc_ids)
+    return {path: entry["sha256"] for path, entry in changed.items()}
+
+
+def iter_documents(doc_ids_by_path):
+    # Pages are yielded one at a time so callers never hold a whole file
+    for path, doc_id in doc_ids_by_path.items():
+        loader = get_loader(path)
+        if loader.cache:
+            pages = iter_cached_pages(text_cache, path, doc_id, loader.version, loader)
+        else:
+            pages = loader(path)
+        for doc in pages:
+            doc.metadata["doc_id"] = doc_id
+            yield doc
+
+
+def load_documents_from_file(documents_loader, manifest=None):
+    # Only files added or changed since they were last indexed are parsed
+    changed = scan_data_directory(manifest or IngestManifest())
+    return list(iter_documents(changed))
 
 
 def load_documents_from_url(url: str):
     try:
         loader = WebBaseLoader(url)
         documents = loader.load()
+        # A page is indexed once per distinct content, like an uploaded file
+        doc_id = text_sha256("\n".join(doc.page_content for doc in documents))
+        for doc in documents:
+            doc.metadata["doc_id"] = doc_id
         return documents
     except Exception as e:
         print(f"Error loading documents from URL: {e}")
         return []
 
 
+def get_text_splitter():
+    # Chunk size and overlap are measured in tokens (CHUNK_SIZE_TOKENS / CHUNK_OVERLAP_TOKENS)
+    return TiktokenTextSplitter()
+
+
+def iter_text_chunks(docs):
+    # Pages that were split before with the same settings come from the chunk cache
+    yield from iter_cached_chunks(chunk_cache, get_text_splitter(), docs)
+
+
 def get_text_chunks(docs):
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1000000, chunk_overlap=10000
-    )
-    chunks = text_splitter.split_documents(docs)
+    chunks = list(iter_text_chunks(docs))
     return chunks
 
 
-def initialize_vector_database(chunks):
-    db = lancedb.connect("src/lance_database")
-    table = db.create_table(
-        "rag_sample",
-        data=[
-            {
-                "vector": GoogleGenerativeAIEmbeddings(
-                    model="models/embedding-001"
-                ).embed_query("Hello World"),
-                "text": "Hello World",
-                "id": "1",
-            }
-        ],
-        mode="overwrite",
-    )
-    docsearch = LanceDB.from_documents(
-        chunks,
-        GoogleGenerativeAIEmbeddings(model="models/embedding-001"),
-        connection=table,
+def embed_chunks(chunks):
+    return get_embeddings().embed_documents([chunk.page_content for chunk in chunks])
+
+
+def initialize_vector_database(chunks, tenant=DEFAULT_TENANT):
+    # Chunks are appended to the persistent documents table, skipping documents
+    # that are already indexed, and retrieval is limited to their documents
+    doc_ids = sorted({chunk.metadata["doc_id"] for chunk in chunks})
+    new_doc_ids = {doc_id for doc_id in doc_ids if not has_document(doc_id, tenant)}
+    new_chunks = [chunk for chunk in chunks if chunk.metadata["doc_id"] in new_doc_ids]
+    if new_chunks:
+        ChunkWriter(tenant).add(new_chunks, embed_chunks(new_chunks))
+    return get_documents_retriever(
+        get_embeddings(), where=RowFilter(doc_ids=doc_ids), tenant=tenant
     )
-    return docsearch.as_retriever(search_kwargs={"k": 3})
 
 
 def generate_rag_chain(retriever, user_question, memory):
@@ -98,7 +124,7 @@ def generate_rag_chain(retriever, user_question, memory):
     rag_chain = (
         {"context": retriever, "query": RunnablePassthrough()}
         | prompt
-        | ChatGoogleGenerativeAI(model="gemini-pro")
+        | get_chat_model()
         | StrOutputParser()
     )
     return rag_chain
@@ -0,0 +1,113 @@
+import os
+import tempfile
+import threading
+
+import pyarrow as pa
+from langchain_core.documents import Document
+
+TEXT_CACHE_DIR = os.getenv("TEXT_CACHE_DIR", "src/text_cache")
+TEXT_CACHE_MAX_BYTES = int(os.getenv("TEXT_CACHE_MAX_BYTES", 1024**3))
+PAGES_PER_BATCH = 64
+
+PAGE_SCHEMA = pa.schema([("page", pa.int32()), ("text", pa.large_string())])
+
+
+class TextCache:
+    """Extracted page text per (content hash, extractor version).
+
+    Entries are uncompressed Arrow IPC files, so a hit is a memory map rather
+    than a parse. The cache is trimmed to ``max_bytes`` by evicting the least
+    recently used entries; hits refresh an entry's mtime.
+    """
+
+    def __init__(self, directory=TEXT_CACHE_DIR, max_bytes=TEXT_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def _path(self, sha256, version):
+        return os.path.join(self.directory, f"{sha256}-{version}.arrow")
+
+    def iter_pages(self, sha256, version):
+        """Yield ``(page, text)`` from the cache, or return None on a miss."""
+        path = self._path(sha256, version)
+        try:
+            source = pa.memory_map(path, "r")
+        except FileNotFoundError:
+            return None
+        os.utime(path)
+        return self._read(source)
+
+    def _read(self, source):
+        with source:
+            reader = pa.ipc.open_file(source)
+            for index in range(reader.num_record_batches):
+                batch = reader.get_batch(index)
+                yield from zip(batch.column(0).to_pylist(), batch.column(1).to_pylist())
+
+    def write_through(self, sha256, version, pages):
+        """Pass ``(page, text)`` pairs through while caching them.
+
+        The entry is only published once ``pages`` is exhausted, so a failed
+        or abandoned extraction never leaves a partial entry behind.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".part")
+        os.close(fd)
+        published = False
+        try:
+            with pa.OSFile(tmp_path, "wb") as sink:
+                with pa.ipc.new_file(sink, PAGE_SCHEMA) as writer:
+                    numbers, texts = [], []
+                    for number, text in pages:
+                        numbers.append(number)
+                        texts.append(text)
+                        yield number, text
+                        if len(numbers) == PAGES_PER_BATCH:
+                            writer.write_batch(self._batch(numbers, texts))
+                            numbers, texts = [], []
+                    if numbers:
+                        writer.write_batch(self._batch(numbers, texts))
+            os.replace(tmp_path, self._path(sha256, version))
+            published = True
+        finally:
+            if not published:
+                os.remove(tmp_path)
+        self.evict()
+
+    @staticmethod
+    def _batch(numbers, texts):
+        return pa.record_batch(
+            [pa.array(numbers, pa.int32()), pa.array(texts, pa.large_string())],
+            schema=PAGE_SCHEMA,
+        )
+
+    def evict(self):
+        with self._lock:
+            entries = []
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith(".arrow"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+
+
+def iter_cached_pages(cache, path, sha256, version, extract):
+    """Yield page Documents for ``path`` from the cache, extracting on a miss."""
+    pages = cache.iter_pages(sha256, version)
+    if pages is None:
+        pages = cache.write_through(
+            sha256,
+            version,
+            ((doc.metadata["page"], doc.page_content) for doc in extract(path)),
+        )
+    for number, text in pages:
+        yield Document(page_content=text, metadata={"source": path, "page": number})
@@ -0,0 +1,150 @@
+import math
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import lancedb
+
+# Below this many rows a brute-force scan is fast enough and no index is built
+VECTOR_INDEX_MIN_ROWS = int(os.getenv("VECTOR_INDEX_MIN_ROWS", 100_000))
+# Appended rows are folded into the existing index once this many are unindexed
+VECTOR_INDEX_OPTIMIZE_ROWS = int(os.getenv("VECTOR_INDEX_OPTIMIZE_ROWS", 20_000))
+# The index is retrained once the table has grown this much since it was built
+VECTOR_INDEX_REBUILD_GROWTH = float(os.getenv("VECTOR_INDEX_REBUILD_GROWTH", 2.0))
+# Document ids get a BTREE index once a table has this many rows. Page ranges
+# are cheaper to check on the rows it selects than through a BTREE of their own
+SCALAR_INDEX_MIN_ROWS = int(os.getenv("SCALAR_INDEX_MIN_ROWS", 10_000))
+SCALAR_INDEX_COLUMNS = ("doc_id",)
+VECTOR_NPROBES = int(os.getenv("VECTOR_NPROBES", 50))
+VECTOR_REFINE_FACTOR = int(os.getenv("VECTOR_REFINE_FACTOR", 10))
+# Filters matching at most this many rows are searched exactly, without the
+# vector index, which would only find the matches in the partitions it probes
+VECTOR_EXACT_SEARCH_ROWS = int(os.getenv("VECTOR_EXACT_SEARCH_ROWS", 10_000))
+
+
+def index_partitions(rows):
+    return max(1, int(math.sqrt(rows)))
+
+
+def index_sub_vectors(dimensions):
+    # PQ sub-vectors must divide the dimension; 16 values each when possible
+    for width in (16, 8, 4, 2, 1):
+        if dimensions % width == 0:
+            return dimensions // width
+
+
+def index_stats(table):
+    """Statistics of the indexes of ``table``, by indexed column."""
+    dataset = table.to_lance()
+    return {
+        index["fields"][0]: dataset.stats.index_stats(index["name"])
+        for index in dataset.list_indices()
+        if len(index["fields"]) == 1
+    }
+
+
+class VectorIndexManager:
+    """Keeps an IVF_PQ index on the vector column of tables as they grow.
+
+    ``maintain`` is called after appends and does its work on a background
+    thread, through a separate handle so searches on the shared one are never
+    blocked: the index is created once a table reaches ``min_rows``, new rows
+    are folded into it every ``optimize_rows`` and it is retrained after the
+    table grows by ``rebuild_growth``. BTREE indexes on ``scalar_columns``
+    are created once the table has ``scalar_min_rows`` and are folded in
+    with the vector index. ``refresh`` is then called so the shared handle
+    picks up the new indexes. Rows not indexed yet are still found by a
+    scan, so results stay complete in between.
+    """
+
+    def __init__(
+        self,
+        min_rows=VECTOR_INDEX_MIN_ROWS,
+        optimize_rows=VECTOR_INDEX_OPTIMIZE_ROWS,
+        rebuild_growth=VECTOR_INDEX_REBUILD_GROWTH,
+        scalar_min_rows=SCALAR_INDEX_MIN_ROWS,
+        scalar_columns=SCALAR_INDEX_COLUMNS,
+    ):
+        self.min_rows = min_rows
+        self.optimize_rows = optimize_rows
+        self.rebuild_growth = rebuild_growth
+        self.scalar_min_rows = scalar_min_rows
+        self.scalar_columns = scalar_columns
+        self._built_rows = {}
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def plan(self, key, rows, stats):
+        if stats is None:
+            return "build" if rows >= self.min_rows else None
+        built = self._built_rows.setdefault(key, stats["num_indexed_rows"])
+        if rows >= max(self.min_rows, built * self.rebuild_growth):
+            return "build"
+        if stats["num_unindexed_rows"] >= self.optimize_rows:
+            return "optimize"
+        return None
+
+    def plan_scalar(self, rows, stats):
+        """Filter columns to index, and whether their indexes need optimizing."""
+        if rows < self.scalar_min_rows:
+            return [], False
+        missing = [column for column in self.scalar_columns if column not in stats]
+        stale = any(
+            stats[column]["num_unindexed_rows"] >= self.optimize_rows
+            for column in self.scalar_columns
+            if column in stats
+        )
+        return missing, stale
+
+    def maintain(self, uri, table_name, refresh=None):
+        key = (uri, table_name)
+        with self._lock:
+            if key in self._pending:
+                return
+            self._pending.add(key)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=1, thread_name_prefix="vector-index"
+                )
+            self._executor.submit(self.run, uri, table_name, refresh)
+
+    def run(self, uri, table_name, refresh=None):
+        """Create, optimize or retrain the indexes of one table if it is due."""
+        key = (uri, table_name)
+        try:
+            table = lancedb.connect(uri).open_table(table_name)
+            rows = table.count_rows()
+            stats = index_stats(table)
+            action = self.plan(key, rows, stats.get("vector"))
+            missing, stale = self.plan_scalar(rows, stats)
+            for column in missing:
+                table.create_scalar_index(column, replace=True)
+            if stale and action is None:
+                action = "optimize"
+            if action == "build":
+                dimensions = table.schema.field("vector").type.list_size
+                table.create_index(
+                    metric="L2",
+                    num_partitions=index_partitions(rows),
+                    num_sub_vectors=index_sub_vectors(dimensions),
+                    vector_column_name="vector",
+                    replace=True,
+                )
+                self._built_rows[key] = rows
+            elif action == "optimize":
+                table.to_lance().optimize.optimize_indices()
+            if (action or missing) and refresh is not None:
+                refresh()
+            return action
+        except Exception as e:
+            print(f"Error maintaining the vector index of {table_name}: {e}")
+        finally:
+            with self._lock:
+                self._pending.discard(key)
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
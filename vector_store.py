@@ -0,0 +1,407 @@
+from abc import ABC, abstractmethod
+import collections
+import functools
+import os
+import threading
+from typing import Any
+
+import lancedb
+import pyarrow as pa
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from filters import in_filter, quote_sql
+from keyword_index import get_keyword_index
+from tenants import DEFAULT_TENANT, check_tenant
+from vector_index import (
+    VECTOR_EXACT_SEARCH_ROWS,
+    VECTOR_NPROBES,
+    VECTOR_REFINE_FACTOR,
+    VectorIndexManager,
+)
+
+LANCE_DB_URI = os.getenv("LANCE_DB_URI", "src/lance_database")
+DOCUMENTS_TABLE = os.getenv("DOCUMENTS_TABLE", "documents")
+VECTOR_STORE = os.getenv("VECTOR_STORE", "lancedb")
+# Dense results are fused with BM25 ones unless HYBRID_SEARCH=0
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "1") == "1"
+# Rows taken from each ranking before fusion
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", 20))
+RRF_K = int(os.getenv("RRF_K", 60))
+ROW_COLUMNS = ["id", "text", "doc_id", "source", "page"]
+
+
+def documents_schema(dimensions):
+    return pa.schema(
+        [
+            pa.field("vector", pa.list_(pa.float32(), dimensions)),
+            pa.field("id", pa.string()),
+            pa.field("text", pa.string()),
+            pa.field("doc_id", pa.string()),
+            pa.field("source", pa.string()),
+            pa.field("page", pa.int64()),
+        ]
+    )
+
+
+def chunk_row(chunk, vector, row_id):
+    return {
+        "vector": vector,
+        "id": row_id,
+        "text": chunk.page_content,
+        "doc_id": chunk.metadata.get("doc_id", ""),
+        "source": str(chunk.metadata.get("source", "")),
+        "page": int(chunk.metadata.get("page", -1)),
+    }
+
+
+def tenant_table(tenant=DEFAULT_TENANT):
+    # Each tenant gets its own table, so a search only scans that tenant's rows
+    tenant = check_tenant(tenant)
+    if tenant == DEFAULT_TENANT:
+        return DOCUMENTS_TABLE
+    return f"{DOCUMENTS_TABLE}__{tenant}"
+
+
+def doc_ids_filter(doc_ids):
+    return in_filter("doc_id", doc_ids)
+
+
+_tables = {}
+_tables_lock = threading.Lock()
+_write_lock = threading.Lock()
+index_manager = VectorIndexManager()
+
+
+def open_documents_table(tenant=DEFAULT_TENANT, dimensions=None, uri=LANCE_DB_URI):
+    """Return the process-wide handle of the documents table of ``tenant``.
+
+    The table is opened once and every reader and writer shares the handle.
+    When it does not exist yet it is created empty with ``dimensions``, or
+    None is returned if no size is given.
+    """
+    table_name = tenant_table(tenant)
+    with _tables_lock:
+        if (uri, table_name) not in _tables:
+            db = lancedb.connect(uri)
+            if table_name in db.table_names():
+                _tables[uri, table_name] = db.open_table(table_name)
+            elif dimensions:
+                _tables[uri, table_name] = db.create_table(
+                    table_name, schema=documents_schema(dimensions)
+                )
+            else:
+                return None
+        return _tables[uri, table_name]
+
+
+def append_rows(rows, tenant=DEFAULT_TENANT, uri=LANCE_DB_URI):
+    if not rows:
+        return 0
+    table = open_documents_table(tenant, len(rows[0]["vector"]), uri)
+    table.add(rows)
+    maintain_vector_index(tenant, uri)
+    return len(rows)
+
+
+def refresh_documents_table(tenant=DEFAULT_TENANT, uri=LANCE_DB_URI):
+    # Picks up commits made through other handles, such as a rebuilt index
+    table = open_documents_table(tenant, uri=uri)
+    with _write_lock:
+        table.checkout_latest()
+
+
+def maintain_vector_index(tenant=DEFAULT_TENANT, uri=LANCE_DB_URI):
+    index_manager.maintain(
+        uri,
+        tenant_table(tenant),
+        functools.partial(refresh_documents_table, tenant, uri),
+    )
+
+
+class VectorStore(ABC):
+    """Chunk rows of one tenant, whatever the index behind them.
+
+    Rows are dicts with ``vector``, ``id``, ``text``, ``doc_id``, ``source``
+    and ``page``. ``search`` returns the nearest rows without their vector and
+    with a ``_distance`` (squared L2), optionally only among the rows matching
+    a RowFilter, which backends apply before the search; ``get`` returns rows
+    by id, in no particular order.
+    Backends are registered with ``register_vector_store`` and picked with
+    VECTOR_STORE.
+    """
+
+    @abstractmethod
+    def open(self, dimensions):
+        raise NotImplementedError
+
+    @abstractmethod
+    def add(self, rows):
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete(self, doc_ids):
+        raise NotImplementedError
+
+    @abstractmethod
+    def has_document(self, doc_id):
+        raise NotImplementedError
+
+    @abstractmethod
+    def count(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    def get(self, ids):
+        raise NotImplementedError
+
+    @abstractmethod
+    def search(self, vector, k, where=None):
+        raise NotImplementedError
+
+
+class LanceDBStore(VectorStore):
+    """One LanceDB table per tenant, indexed by VectorIndexManager as it grows."""
+
+    def __init__(
+        self,
+        tenant=DEFAULT_TENANT,
+        uri=LANCE_DB_URI,
+        nprobes=VECTOR_NPROBES,
+        refine_factor=VECTOR_REFINE_FACTOR,
+        exact_rows=VECTOR_EXACT_SEARCH_ROWS,
+    ):
+        self.tenant = tenant
+        self.uri = uri
+        # IVF partitions probed and candidates re-ranked on exact distances;
+        # only used once the table has an index
+        self.nprobes = nprobes
+        self.refine_factor = refine_factor
+        self.exact_rows = exact_rows
+
+    @property
+    def table(self):
+        return open_documents_table(self.tenant, uri=self.uri)
+
+    def open(self, dimensions):
+        open_documents_table(self.tenant, dimensions, self.uri)
+        # Index a table that grew past the threshold before the last shutdown
+        maintain_vector_index(self.tenant, self.uri)
+
+    def add(self, rows):
+        return append_rows(rows, self.tenant, self.uri)
+
+    def delete(self, doc_ids):
+        table = self.table
+        if table is None or not doc_ids:
+            return
+        table.delete(doc_ids_filter(doc_ids))
+
+    def has_document(self, doc_id):
+        table = self.table
+        if table is None:
+            return False
+        return table.count_rows(f"doc_id = {quote_sql(doc_id)}") > 0
+
+    def count(self):
+        table = self.table
+        return 0 if table is None else table.count_rows()
+
+    def get(self, ids):
+        table = self.table
+        if table is None or not ids:
+            return []
+        rows = table.to_lance().to_table(
+            columns=ROW_COLUMNS, filter=in_filter("id", ids)
+        )
+        return rows.to_pylist()
+
+    def search(self, vector, k, where=None):
+        table = self.table
+        # Scalar indexes on the filter columns select the rows to search
+        predicate = where and where.sql()
+        if predicate and table.count_rows(predicate) <= self.exact_rows:
+            rows = table.to_lance().to_table(
+                columns=ROW_COLUMNS,
+                nearest={"column": "vector", "q": vector, "k": k, "use_index": False},
+                filter=predicate,
+                prefilter=True,
+            )
+            return rows.to_pylist()
+        search = (
+            table.search(vector)
+            .limit(k)
+            .nprobes(self.nprobes)
+            .refine_factor(self.refine_factor)
+        )
+        if predicate:
+            search = search.where(predicate, prefilter=True)
+        return search.to_arrow().drop(["vector"]).to_pylist()
+
+
+_backends = {}
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def register_vector_store(name):
+    def decorator(factory):
+        _backends[name] = factory
+        return factory
+
+    return decorator
+
+
+def vector_stores():
+    return sorted(_backends)
+
+
+def get_vector_store(tenant=DEFAULT_TENANT, backend=VECTOR_STORE):
+    """Return the store of ``tenant`` in the VECTOR_STORE backend, one per process."""
+    if backend not in _backends:
+        raise ValueError(
+            f"Unknown vector store {backend!r}, expected one of {vector_stores()}."
+        )
+    tenant = check_tenant(tenant)
+    with _stores_lock:
+        if (backend, tenant) not in _stores:
+            _stores[backend, tenant] = _backends[backend](tenant)
+        return _stores[backend, tenant]
+
+
+@register_vector_store("lancedb")
+def lancedb_store(tenant):
+    return LanceDBStore(tenant)
+
+
+@register_vector_store("faiss-flat")
+def faiss_flat_store(tenant):
+    from faiss_store import FaissStore
+
+    return FaissStore(tenant, "flat")
+
+
+@register_vector_store("faiss-ivf")
+def faiss_ivf_store(tenant):
+    from faiss_store import FaissStore
+
+    return FaissStore(tenant, "ivf")
+
+
+@register_vector_store("faiss-hnsw")
+def faiss_hnsw_store(tenant):
+    from faiss_store import FaissStore
+
+    return FaissStore(tenant, "hnsw")
+
+
+@register_vector_store("chroma")
+def chroma_store(tenant):
+    from chroma_store import ChromaStore
+
+    return ChromaStore(tenant)
+
+
+class ChunkWriter:
+    """Appends embedded chunks to a tenant's vector store one batch at a time.
+
+    The first time a document id is seen its existing rows are deleted, so
+    re-ingesting a document replaces it instead of duplicating it.
+    """
+
+    def __init__(self, tenant=DEFAULT_TENANT, store=None):
+        self.store = store or get_vector_store(tenant)
+        self.keywords = get_keyword_index(tenant)
+        self.chunk_counts = {}
+
+    def add(self, chunks, vectors):
+        new_doc_ids = []
+        rows = []
+        for chunk, vector in zip(chunks, vectors):
+            doc_id = chunk.metadata["doc_id"]
+            if doc_id not in self.chunk_counts:
+                self.chunk_counts[doc_id] = 0
+                new_doc_ids.append(doc_id)
+            rows.append(
+                chunk_row(chunk, vector, f"{doc_id}-{self.chunk_counts[doc_id]}")
+            )
+            self.chunk_counts[doc_id] += 1
+        # Replacing a document's rows is one step for concurrent writers
+        with _write_lock:
+            self.store.delete(new_doc_ids)
+            self.keywords.delete(new_doc_ids)
+            added = self.store.add(rows)
+            self.keywords.add(rows)
+            return added
+
+
+def delete_documents(doc_ids, tenant=DEFAULT_TENANT):
+    get_vector_store(tenant).delete(doc_ids)
+    get_keyword_index(tenant).delete(doc_ids)
+
+
+def has_document(doc_id, tenant=DEFAULT_TENANT):
+    return get_vector_store(tenant).has_document(doc_id)
+
+
+def reciprocal_rank_fusion(rankings, k=RRF_K):
+    """Ids of several rankings (lists of ids, best first), best fused score first."""
+    scores = collections.defaultdict(float)
+    for ranking in rankings:
+        for rank, row_id in enumerate(ranking):
+            scores[row_id] += 1 / (k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+class DocumentsRetriever(BaseRetriever):
+    """Nearest chunks of one tenant's store, optionally matching a RowFilter.
+
+    With a ``keywords`` index, the ``candidates`` best dense rows and BM25 rows
+    are fused with reciprocal rank fusion, so exact terms such as rule names
+    or error codes are found even when their embedding is not close.
+    """
+
+    store: Any
+    embeddings: Any
+    k: int = 3
+    where: Any = None
+    keywords: Any = None
+    candidates: int = HYBRID_CANDIDATES
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        if self.where is not None and self.where.matches_nothing:
+            return []
+        vector = self.embeddings.embed_query(query)
+        if self.keywords is None:
+            rows = self.store.search(vector, self.k, self.where)
+        else:
+            rows = self._hybrid_search(query, vector)
+        return [Document(page_content=row.pop("text"), metadata=row) for row in rows]
+
+    def _hybrid_search(self, query, vector):
+        fetch = max(self.k, self.candidates)
+        dense = self.store.search(vector, fetch, self.where)
+        sparse = self.keywords.search(query, fetch, self.where)
+        ids = reciprocal_rank_fusion(
+            [[row["id"] for row in dense], [row["id"] for row in sparse]]
+        )[: self.k]
+        rows = {row["id"]: row for row in dense}
+        # Rows found by BM25 alone are read from the store
+        rows.update(
+            (row["id"], row)
+            for row in self.store.get([i for i in ids if i not in rows])
+        )
+        return [rows[row_id] for row_id in ids if row_id in rows]
+
+
+def get_documents_retriever(embeddings, k=3, where=None, tenant=DEFAULT_TENANT):
+    store = get_vector_store(tenant)
+    if not store.count():
+        return None
+    return DocumentsRetriever(
+        store=store,
+        embeddings=embeddings,
+        k=k,
+        where=where,
+        keywords=get_keyword_index(tenant) if HYBRID_SEARCH else None,
+    )